@@ -0,0 +1,156 @@
+"""
+Run agent prompts headlessly, for load tests and regression tests before a rollout.
+
+    python batch_runner.py prompts.jsonl --agent-id my-agent --concurrency 8 --output results.jsonl
+
+Each input line is a JSON object with a "prompt" (a bare JSON string also
+works) and optionally an "id" and an "agent_id" overriding --agent-id. Every
+prompt starts a new chat and goes through the same send / tool-call loop and
+rate limiter as the Chat tab (--rate-limit 0 turns the limiter off). With
+--cache-tool-results, results of cacheable functions are reused across
+prompts as with the app's "Cache tool results" option. Each
+result is written as one JSON line as it finishes, in completion order, and a
+final {"summary": ...} line gives p50/p95/p99 end-to-end latency and throughput.
+The API key comes from --api-key or WORKATO_API_KEY; WORKATO_CHAT_API_URL
+selects the API as for the app.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from workato_api import (
+    RATE_LIMIT_PER_SECOND,
+    RateLimiter,
+    ResponseCache,
+    api_request,
+    make_http_client,
+    process_agent_responses,
+    quantile,
+)
+
+# The app's user_email for chats it starts
+USER_EMAIL = "user@example.com"
+
+
+def read_prompts(path):
+    """Parse the prompts file into a list of {"id", "prompt", "agent_id"} dicts."""
+    prompts = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"prompt": item}
+            if not item.get("prompt"):
+                raise ValueError(f"{path}:{line_number}: no prompt")
+            prompts.append({"id": item.get("id", line_number), "prompt": item["prompt"],
+                            "agent_id": item.get("agent_id")})
+    return prompts
+
+
+def run_prompt(client, api_key, agent_id, item, cache=None, tool_cache=None):
+    """
+    Send one prompt in a new chat and follow the agent's tool calls to the end.
+    cache and tool_cache are ResponseCaches shared by all prompts, or None.
+    """
+    tool_calls = []
+
+    def record_tool_call(call, result):
+        tool_calls.append({"name": call.get("tool_call_name", ""), "args": call.get("args", ""), "result": result})
+
+    started = time.perf_counter()
+    response = api_request(client, api_key, cache, "POST", "/agents/chats/send", data={
+        "agent_id": agent_id,
+        "user_email": USER_EMAIL,
+        "incoming_steps": [{"payload": {"step_type": "human_message", "content": item["prompt"]}}],
+    })
+    messages = []
+    if "agent_response" in response:
+        messages = process_agent_responses(client, api_key, cache, agent_id, response.get("chat_id"),
+                                           response["agent_response"], on_tool_call=record_tool_call,
+                                           tool_cache=tool_cache)
+    seconds = time.perf_counter() - started
+    error = response.get("error") or response.get("error_reason") or (
+        "" if "agent_response" in response else "no agent_response")
+    return {
+        "id": item["id"],
+        "agent_id": agent_id,
+        "prompt": item["prompt"],
+        "chat_id": response.get("chat_id"),
+        "response": "\n".join(m["content"] for m in messages if not m["content"].startswith("`Executed function")),
+        "tool_calls": tool_calls,
+        "seconds": round(seconds, 3),
+        "error": error,
+    }
+
+
+def summarize(results, wall_seconds):
+    latencies = [r["seconds"] for r in results if not r["error"]]
+    return {
+        "prompts": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "tool_calls": sum(len(r["tool_calls"]) for r in results),
+        "p50_seconds": round(quantile(latencies, 0.5), 3),
+        "p95_seconds": round(quantile(latencies, 0.95), 3),
+        "p99_seconds": round(quantile(latencies, 0.99), 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "prompts_per_second": round(len(results) / wall_seconds, 3) if wall_seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("prompts", help="JSONL file of prompts")
+    parser.add_argument("--agent-id", help="agent for prompts that do not name one")
+    parser.add_argument("--api-key", default=os.environ.get("WORKATO_API_KEY", ""))
+    parser.add_argument("--concurrency", type=int, default=4, help="prompts in flight at once")
+    parser.add_argument("--rate-limit", type=float, default=RATE_LIMIT_PER_SECOND,
+                        help="most API requests per second, as in the app (0: no rate limiter)")
+    parser.add_argument("--cache-tool-results", action="store_true",
+                        help="reuse results of cacheable functions across prompts")
+    parser.add_argument("--output", help="results file (default: stdout)")
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("set --api-key or WORKATO_API_KEY")
+
+    prompts = read_prompts(args.prompts)
+    missing = [p["id"] for p in prompts if not (p["agent_id"] or args.agent_id)]
+    if missing:
+        parser.error(f"no agent for prompts {missing}; pass --agent-id")
+
+    # Each prompt may run TOOL_CALL_CONCURRENCY tool calls at once on top of its own send
+    limiter = RateLimiter(rate=args.rate_limit, burst=args.rate_limit * 2) if args.rate_limit else None
+    client = make_http_client(pool_size=max(args.concurrency * 2, 10), limiter=limiter)
+    # The function lists that say which tools are cacheable are fetched once, through cache
+    cache = ResponseCache() if args.cache_tool_results else None
+    tool_cache = ResponseCache() if args.cache_tool_results else None
+    output = open(args.output, "w") if args.output else sys.stdout
+    results = []
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="prompt") as pool:
+            futures = [pool.submit(run_prompt, client, args.api_key, item["agent_id"] or args.agent_id, item,
+                                   cache, tool_cache)
+                       for item in prompts]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+        summary = summarize(results, time.perf_counter() - started)
+        if tool_cache is not None:
+            summary["tool_cache_hits"] = tool_cache.hits + tool_cache.coalesced
+        output.write(json.dumps({"summary": summary}) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Rerun benchmarks for streamlit_app.py, run against mock_server.py.
+
+    python benchmark.py
+    python benchmark.py --latency 0.1 --tool-latency 0.3 --docs 200 --json results.json
+
+Each scenario drives the app with Streamlit's AppTest and reports the wall
+time of its rerun(s) and the API calls the mock server saw. The mock runs
+in-process on a free port; nothing touches the real APIM.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import mock_server
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+
+
+def find_button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def run_scenarios(docs):
+    """Yield (name, action) pairs; each action takes the AppTest and performs one interaction."""
+    yield "open app (cold caches)", lambda at: at.sidebar.text_input[0].input("benchmark-key").run()
+    yield "rerun, nothing changed", lambda at: at.run()
+
+    def restart(at):
+        # Drops every in-process cache; the on-disk HTTP cache survives, as across a deploy
+        st.cache_resource.clear()
+        at.run()
+    yield "restart (warm HTTP cache)", restart
+    yield "switch to Chat", lambda at: at.radio(key="active_section").set_value("Chat").run()
+    yield "select agent", lambda at: at.selectbox(key="chat_agent").set_value("mock-agent").run()
+    yield "start conversation", lambda at: find_button(at, "Start New Conversation").click().run()
+    yield "send chat, no tools", lambda at: at.chat_input[0].set_value("hello").run()
+    yield "send chat with 3 tool calls", lambda at: at.chat_input[0].set_value("please use 3 tools").run()
+    yield "turn on tool result cache", lambda at: at.checkbox(key="cache_tool_results").check().run()
+    yield "3 tool calls, tool cache cold", lambda at: at.chat_input[0].set_value("please use 3 tools").run()
+    yield "3 tool calls, tool cache warm", lambda at: at.chat_input[0].set_value("please use 3 tools").run()
+    yield "switch to Functions", lambda at: at.radio(key="active_section").set_value("Functions").run()
+    yield "switch to Knowledge Bases", lambda at: at.radio(key="active_section").set_value("Knowledge Bases").run()
+
+    def pick_directory(at):
+        at.radio(key="bulk_source").set_value("Server directory").run()
+        at.text_input(key="bulk_dir").input("docs").run()
+    yield "list 1 directory", pick_directory
+    yield f"upload {docs:,} docs", lambda at: find_button(at, "📤 Start Bulk Upload").click().run()
+    yield f"re-upload {docs:,} unchanged docs", lambda at: find_button(at, "📤 Start Bulk Upload").click().run()
+    yield "switch to Search", lambda at: at.radio(key="active_section").set_value("Search").run()
+
+    def search(at):
+        at.text_input[0].input("document 7").run()
+        find_button(at, "Search").click().run()
+    yield "semantic search", search
+    yield "same search again", lambda at: find_button(at, "Search").click().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the mock adds to every request")
+    parser.add_argument("--tool-latency", type=float, default=0.2, help="extra seconds for POST /tools/execute")
+    parser.add_argument("--payload-size", type=int, default=200, help="characters of filler in mock records")
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--registries", type=int, default=5)
+    parser.add_argument("--docs", type=int, default=1000, help="documents in the bulk upload scenario")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    mock_server.TOKEN_DELAY = 0
+    mock_server.LATENCY = args.latency
+    mock_server.TOOL_LATENCY = args.tool_latency
+    mock_server.PAYLOAD_SIZE = args.payload_size
+    mock_server.seed(agents=args.agents, registries=args.registries)
+    server = mock_server.make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix="playground-bench-")
+    os.makedirs(os.path.join(workdir, "docs"))
+    for i in range(args.docs):
+        with open(os.path.join(workdir, "docs", f"doc{i:05d}.txt"), "w") as f:
+            f.write(f"Benchmark document {i}. " * 20)
+    # Read by the app on every run
+    os.environ["WORKATO_CHAT_API_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["PLAYGROUND_DATA_DIR"] = os.path.join(workdir, "data")
+    os.environ["PLAYGROUND_INGEST_ROOT"] = workdir
+
+    st.cache_resource.clear()
+    at = AppTest.from_file(APP_PATH, default_timeout=max(60, args.docs))
+    at.run()
+
+    results = []
+    print(f"{'scenario':34s} {'seconds':>8s} {'calls':>6s}  endpoints")
+    for name, action in run_scenarios(args.docs):
+        mock_server.REQUEST_LOG.clear()
+        started = time.perf_counter()
+        action(at)
+        seconds = time.perf_counter() - started
+        calls = Counter(f"{method} {path}" for method, path in mock_server.REQUEST_LOG)
+        errors = [str(e.value) for e in at.exception]
+        results.append({"scenario": name, "seconds": round(seconds, 3),
+                        "api_calls": sum(calls.values()), "endpoints": dict(calls), "errors": errors})
+        summary = ", ".join(f"{endpoint} x{count}" for endpoint, count in calls.most_common())
+        print(f"{name:34s} {seconds:8.2f} {sum(calls.values()):6d}  {summary}")
+        if errors:
+            print(f"    errors: {errors}")
+
+    server.shutdown()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
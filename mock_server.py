@@ -0,0 +1,422 @@
+"""
+A local stand-in for the Workato Chat API, for trying the playground without APIM.
+
+    python mock_server.py --port 8000
+    WORKATO_CHAT_API_URL=http://localhost:8000 streamlit run streamlit_app.py
+
+Implements every endpoint the playground calls: /agents, /agents/chats*,
+/tools/execute, /functions* and /knowledge*. Data lives in memory and is
+seeded with --agents, --registries and --knowledge-bases records; --latency
+and --payload-size make responses slower and bigger, and --rate-limit makes
+it answer 429 Too Many Requests like a throttling APIM.
+
+POST /agents/chats/send streams its reply as server-sent events when the
+request asks for text/event-stream, and answers with plain JSON otherwise.
+Messages containing the word "tool" make the agent call a tool first;
+"3 tools" makes it call three at once. The list endpoints and the swagger
+carry an ETag and answer If-None-Match with 304 Not Modified.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Seconds between streamed text fragments
+TOKEN_DELAY = 0.05
+# Seconds added to every request, plus up to LATENCY_JITTER more at random
+LATENCY = 0.0
+LATENCY_JITTER = 0.0
+# Extra seconds for POST /tools/execute, which runs a customer API behind APIM
+TOOL_LATENCY = 0.0
+# Characters of filler in descriptions, instructions and tool results
+PAYLOAD_SIZE = 0
+# Requests per second served before answering 429 Too Many Requests (0: no limit)
+RATE_LIMIT = 0
+
+AGENTS = []
+# function_registry_id -> {"created_at", "updated_at", "swagger", "functions"}
+REGISTRIES = {}
+# knowledge_base_id -> {"name", "description", "documents": {document_id: text}}
+KNOWLEDGE_BASES = {}
+# chat_id -> {"agent_id", "Created_at", "steps"}
+CHATS = {}
+# (method, path) of every request served, for benchmarks that count API calls
+REQUEST_LOG = []
+# Times of the requests served in the last second, for RATE_LIMIT
+_recent = []
+_lock = threading.Lock()
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def filler(label):
+    """label padded to PAYLOAD_SIZE characters."""
+    return label + " " + "x" * max(0, PAYLOAD_SIZE - len(label) - 1) if PAYLOAD_SIZE else label
+
+
+def make_function(registry_id, index, verb="GET"):
+    return {"chat_function": {
+        "id": f"{registry_id}-fn{index}",
+        "name": f"{registry_id.replace('-', '_')}_fn{index}",
+        "description": filler(f"Function {index} of {registry_id}"),
+        "internal_metadata": {"verb": verb, "apim_endpoint": f"/{registry_id}/fn{index}"},
+        "input_schema": {"type": "object", "properties": {"id": {"type": "string"}}},
+        "output_schema": {"type": "object"},
+    }}
+
+
+# The function behind the agent's tool calls (see agent_reply); its results may be reused for a minute
+LOOKUP_TIME_FUNCTION = {"chat_function": {
+    "id": "mock-registry-lookup-time",
+    "name": "lookup_time",
+    "description": "Current time on the mock server",
+    "internal_metadata": {"verb": "GET", "apim_endpoint": "/time", "cacheable": True, "cache_ttl_seconds": 60},
+    "input_schema": {"type": "object", "properties": {"index": {"type": "integer"}}},
+    "output_schema": {"type": "object"},
+}}
+
+
+def seed(agents=1, registries=1, functions=5, knowledge_bases=1):
+    """Reset the in-memory data to the given number of records."""
+    with _lock:
+        REGISTRIES.clear()
+        for r in range(registries):
+            registry_id = "mock-registry" if r == 0 else f"mock-registry-{r}"
+            REGISTRIES[registry_id] = {
+                "created_at": now(), "updated_at": now(),
+                "swagger": json.dumps({"openapi": "3.0.0", "info": {"title": registry_id}, "paths": {}}),
+                "functions": [make_function(registry_id, i) for i in range(functions)]
+                + ([LOOKUP_TIME_FUNCTION] if r == 0 else []),
+            }
+        KNOWLEDGE_BASES.clear()
+        for k in range(knowledge_bases):
+            KNOWLEDGE_BASES[f"mock-kb-{k}" if k else "mock-kb"] = {
+                "name": f"Mock KB {k}", "description": filler("Knowledge base for the mock agent"), "documents": {},
+            }
+        AGENTS.clear()
+        for a in range(agents):
+            AGENTS.append({
+                "Agent_ID": "mock-agent" if a == 0 else f"mock-agent-{a}",
+                "Agent_Name": "Mock Agent" if a == 0 else f"Mock Agent {a}",
+                "description": filler("Replies from mock_server.py"),
+                "instruction": filler("Echo the user and call a tool when asked."),
+                "knowledge": json.dumps(list(KNOWLEDGE_BASES)[:1]),
+                "functions": next(iter(REGISTRIES), None),
+            })
+        CHATS.clear()
+
+
+def agent_reply(incoming_steps):
+    """Build the agent_response list for a batch of incoming steps."""
+    tool_results = [s["payload"] for s in incoming_steps if s["payload"].get("step_type") == "tool_execution_response"]
+    if tool_results:
+        return [{"content": f"The tool returned {len(tool_results)} result(s): "
+                            + "; ".join(r.get("content", "")[:200] for r in tool_results)}]
+    text = incoming_steps[-1]["payload"].get("content", "") if incoming_steps else ""
+    response = [{"content": f"You said: {text}"}]
+    if "tool" in text.lower():
+        count = re.search(r"(\d+)\s+tools?", text.lower())
+        for i in range(int(count.group(1)) if count else 1):
+            response.append({
+                "tool_call_id": f"call_{uuid.uuid4().hex[:8]}",
+                "tool_call_name": "lookup_time",
+                "APIM_VERB": "GET",
+                "APIM_ENDPOINT": "/time",
+                "args": json.dumps({"index": i}),
+                "Function_registry_id": "mock-registry",
+            })
+    return response
+
+
+def search_chunks(kb_ids, matches, limit):
+    """Up to limit chunks from the given knowledge bases whose text satisfies matches."""
+    chunks = []
+    for kb_id in kb_ids or list(KNOWLEDGE_BASES):
+        for document_id, text in KNOWLEDGE_BASES.get(kb_id, {}).get("documents", {}).items():
+            if matches(text):
+                chunks.append({"knowledge_base_id": kb_id, "document_id": document_id, "content": text[:500]})
+    return chunks[:int(limit or 3)]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, status=200, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def send_events(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for event in events:
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(TOKEN_DELAY)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def throttled(self):
+        """Answer 429 and return True if RATE_LIMIT requests were already served in the last second."""
+        if not RATE_LIMIT:
+            return False
+        with _lock:
+            now = time.monotonic()
+            _recent[:] = [t for t in _recent if now - t < 1]
+            throttled = len(_recent) >= RATE_LIMIT
+            if not throttled:
+                _recent.append(now)
+        if throttled:
+            self.send_json({"error": "Too many requests"}, status=429, headers={"Retry-After": "1"})
+        return throttled
+
+    def simulate_latency(self, path):
+        with _lock:
+            REQUEST_LOG.append((self.command, path))
+        delay = LATENCY + random.uniform(0, LATENCY_JITTER)
+        if path == "/tools/execute":
+            delay += TOOL_LATENCY
+        if delay:
+            time.sleep(delay)
+
+    def send_cacheable(self, data):
+        """Send data (bytes of JSON) with an ETag, or a bare 304 if the client already has it."""
+        etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_swagger(self, registry_id):
+        registry = REGISTRIES.get(registry_id)
+        if not registry:
+            self.send_json({"error": f"Unknown registry {registry_id}"}, status=404)
+            return
+        self.send_cacheable(registry["swagger"].encode())
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if self.throttled():
+            return
+        self.simulate_latency(url.path)
+        if url.path == "/agents":
+            records = AGENTS
+            if "page" in query:
+                limit = int(query.get("limit", 25))
+                first = (int(query["page"]) - 1) * limit
+                records = records[first:first + limit]
+            self.send_cacheable(json.dumps({"Records": records}).encode())
+        elif url.path == "/agents/chats":
+            self.send_json({"Records": [
+                {"chat_id": chat_id, "Created_at": chat["Created_at"]}
+                for chat_id, chat in list(CHATS.items()) if chat["agent_id"] == query.get("agent_id")
+            ]})
+        elif url.path == "/agents/chats/history":
+            steps = CHATS.get(query.get("chat_id"), {}).get("steps", [])
+            if query.get("created_after"):
+                steps = [s for s in steps if s["created_at"] > query["created_after"]]
+            self.send_json({"steps": steps})
+        elif url.path == "/functions":
+            self.send_cacheable(json.dumps({"function_registries": [
+                {"function_registry_id": registry_id, "created_at": r["created_at"], "updated_at": r["updated_at"]}
+                for registry_id, r in list(REGISTRIES.items())
+            ]}).encode())
+        elif url.path == "/functions/function-list":
+            registry = REGISTRIES.get(query.get("function_registry_id"), {})
+            self.send_cacheable(json.dumps({"chat_functions": registry.get("functions", [])}).encode())
+        elif url.path == "/functions/swagger":
+            self.send_swagger(query.get("function_registry_id"))
+        elif url.path == "/knowledge":
+            self.send_cacheable(json.dumps({"knowledge_bases": [
+                {"knowledge_base_id": kb_id, "name": kb["name"], "description": kb["description"]}
+                for kb_id, kb in list(KNOWLEDGE_BASES.items())
+            ]}).encode())
+        else:
+            self.send_json({"error": f"Unknown endpoint {url.path}"}, status=404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.read_json()
+        if self.throttled():
+            return
+        self.simulate_latency(url.path)
+        if url.path == "/agents/chats/send":
+            chat_id = body.get("chat_id") or f"chat_{uuid.uuid4().hex[:8]}"
+            with _lock:
+                chat = CHATS.setdefault(chat_id, {"agent_id": body.get("agent_id"), "Created_at": now(), "steps": []})
+            incoming = body.get("incoming_steps", [])
+            response = agent_reply(incoming)
+            for step in incoming:
+                payload = dict(step["payload"])
+                if payload.get("step_type") == "human_message":
+                    payload["step_type"] = "user_message"
+                chat["steps"].append({"id": uuid.uuid4().hex, "payload": payload, "created_at": now()})
+            for item in response:
+                chat["steps"].append({"id": uuid.uuid4().hex, "payload": {"step_type": "agent_message", **item},
+                                      "created_at": now()})
+            if "text/event-stream" not in self.headers.get("Accept", ""):
+                self.send_json({"chat_id": chat_id, "agent_response": response})
+                return
+            events = [{"chat_id": chat_id}]
+            for item in response:
+                for word in item.get("content", "").split(" "):
+                    events.append({"delta": word + " "})
+                if item.get("tool_call_id"):
+                    events.append({"agent_response": [{k: v for k, v in item.items() if k != "content"}]})
+            self.send_events(events)
+        elif url.path == "/tools/execute":
+            self.send_json({"tool_call_id": body.get("tool_call_id"), "result": filler(now())})
+        elif url.path == "/functions/upsert":
+            registry_id = body.get("function_registry_id")
+            if not registry_id or not body.get("swagger"):
+                self.send_json({"message": "function_registry_id and swagger are required"}, status=400)
+                return
+            try:
+                paths = json.loads(body["swagger"]).get("paths", {})
+            except ValueError:
+                paths = {}
+            functions = [make_function(registry_id, i, verb.upper())
+                         for i, (path, verbs) in enumerate(paths.items()) for verb in verbs]
+            with _lock:
+                created = REGISTRIES.get(registry_id, {}).get("created_at", now())
+                REGISTRIES[registry_id] = {"created_at": created, "updated_at": now(),
+                                           "swagger": body["swagger"], "functions": functions}
+            self.send_json({"function_registry_id": registry_id})
+        elif url.path == "/knowledge/documents/semantic":
+            words = set(body.get("query", "").lower().split())
+            self.send_json({"retrieved_chunks": search_chunks(
+                body.get("knowledge_base_ids_to_query"),
+                lambda text: words & set(text.lower().split()),
+                body.get("number_of_chunks_to_retrieve"),
+            )})
+        elif url.path == "/knowledge/documents/exact":
+            needle = body.get("text", "")
+            self.send_json({"retrieved_chunks": search_chunks(
+                body.get("knowledge_base_ids_to_query"),
+                lambda text: needle and needle in text,
+                body.get("num_of_chunks_to_retrieve"),
+            )})
+        elif url.path == "/knowledge/documents/ask":
+            question = body.get("question", "")
+            chunks = search_chunks(None, lambda text: any(w in text.lower() for w in question.lower().split()), 1)
+            self.send_json({"answer": chunks[0]["content"][:200] if chunks else "I don't know."})
+        else:
+            self.send_json({"error": f"Unknown endpoint {url.path}"}, status=404)
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        body = self.read_json()
+        if self.throttled():
+            return
+        self.simulate_latency(url.path)
+        if url.path == "/agents":
+            agent_id = body.get("agent_id") or f"agent_{uuid.uuid4().hex[:8]}"
+            record = {
+                "Agent_ID": agent_id,
+                "Agent_Name": body.get("agent_name", ""),
+                "description": body.get("agent_description", ""),
+                "instruction": body.get("agent_instruction", ""),
+                "knowledge": json.dumps(body.get("knowledge_bases", [])),
+                "functions": body.get("function_registry_id"),
+            }
+            with _lock:
+                existing = [i for i, a in enumerate(AGENTS) if a["Agent_ID"] == agent_id]
+                if existing:
+                    AGENTS[existing[0]] = record
+                else:
+                    AGENTS.append(record)
+            self.send_json({"agent_id": agent_id})
+        elif url.path == "/knowledge":
+            data = body.get("data", {})
+            if not data.get("knowledge_base_id"):
+                self.send_json({"error": "knowledge_base_id is required"}, status=400)
+                return
+            with _lock:
+                KNOWLEDGE_BASES.setdefault(data["knowledge_base_id"], {"documents": {}}).update(
+                    name=data.get("name", ""), description=data.get("description", ""))
+            self.send_json({"knowledge_base_id": data["knowledge_base_id"]})
+        elif url.path == "/knowledge/document":
+            kb = KNOWLEDGE_BASES.get(body.get("knowledge_base_id"))
+            if kb is None:
+                self.send_json({"error": f"Unknown knowledge base {body.get('knowledge_base_id')}"}, status=404)
+                return
+            kb["documents"][body.get("document_id")] = body.get("document", "")
+            self.send_json({"document_id": body.get("document_id")})
+        else:
+            self.send_json({"error": f"Unknown endpoint {url.path}"}, status=404)
+
+
+def make_server(host="127.0.0.1", port=8000):
+    """A server ready for serve_forever(); port 0 picks a free port."""
+    return ThreadingHTTPServer((host, port), MockHandler)
+
+
+def main():
+    global TOKEN_DELAY, LATENCY, LATENCY_JITTER, TOOL_LATENCY, PAYLOAD_SIZE, RATE_LIMIT
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--token-delay", type=float, default=TOKEN_DELAY,
+                        help="seconds between streamed text fragments")
+    parser.add_argument("--latency", type=float, default=LATENCY, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=LATENCY_JITTER,
+                        help="up to this many more seconds, at random")
+    parser.add_argument("--tool-latency", type=float, default=TOOL_LATENCY,
+                        help="extra seconds for POST /tools/execute")
+    parser.add_argument("--payload-size", type=int, default=PAYLOAD_SIZE,
+                        help="characters of filler in descriptions and tool results")
+    parser.add_argument("--rate-limit", type=int, default=RATE_LIMIT,
+                        help="requests per second before answering 429 (0: no limit)")
+    parser.add_argument("--agents", type=int, default=1)
+    parser.add_argument("--registries", type=int, default=1)
+    parser.add_argument("--functions", type=int, default=5, help="functions per registry")
+    parser.add_argument("--knowledge-bases", type=int, default=1)
+    args = parser.parse_args()
+    TOKEN_DELAY = args.token_delay
+    LATENCY = args.latency
+    LATENCY_JITTER = args.jitter
+    TOOL_LATENCY = args.tool_latency
+    PAYLOAD_SIZE = args.payload_size
+    RATE_LIMIT = args.rate_limit
+    seed(args.agents, args.registries, args.functions, args.knowledge_bases)
+    server = make_server(args.host, args.port)
+    print(f"Mock Workato Chat API on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,360 @@
 import streamlit as st
 import requests
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 import re
 import os
 import time
-import base64
+import contextvars
+import hashlib
+import math
+import sqlite3
+import sys
+import tempfile
+import threading
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from urllib.parse import urlparse
+
+from workato_api import (
+    BASE_URL,
+    CACHE_INVALIDATIONS,
+    REQUEST_TIMEOUT,
+    SESSION_MESSAGE_BUDGET_BYTES,
+    FunctionCatalog,
+    HttpCache,
+    MessageSpill,
+    MessageStore,
+    RateLimiter,
+    ResponseCache,
+    STALE_WHILE_REVALIDATE_ENDPOINTS,
+    api_key_fingerprint,
+    api_request,
+    in_current_context,
+    make_http_client,
+    process_agent_responses,
+    quantile,
+    reciprocal_rank_fusion,
+    send_request,
+)
+
+SECTIONS = ["Agents", "Chat", "Functions", "Knowledge Bases", "Search"]
+# Query parameter asking /agents/chats/history for steps newer than a timestamp.
+# Steps the API sends anyway are dropped by id, so it is safe if it is ignored.
+HISTORY_SINCE_PARAM = "created_after"
+# Messages rendered at once in a conversation; "Load earlier" pages in more
+CHAT_WINDOW_SIZE = 30
+# Agent list paging. Turn on AGENTS_SERVER_PAGINATION if GET /agents accepts page/limit.
+AGENTS_SERVER_PAGINATION = False
+AGENT_PAGE_SIZES = [10, 25, 50, 100]
+# Conversation list paging. Turn on CHATS_SERVER_PAGINATION if GET /agents/chats accepts page/limit.
+CHATS_SERVER_PAGINATION = False
+CHAT_PAGE_SIZES = [10, 25, 50, 100]
+# Documents bigger than this are uploaded as several parts of about this many bytes
+UPLOAD_PART_SIZE = 1024 * 1024
+DOCUMENT_EXTENSIONS = ["txt", "json", "csv"]
+# Bulk ingestion: concurrent uploads and the most uploads started per second
+INGEST_WORKERS = 4
+INGEST_RATE_PER_SECOND = 5
+# Server-side directory ingestion is only offered for folders under this path
+INGEST_ROOT = os.environ.get("PLAYGROUND_INGEST_ROOT", "")
+# Local state that should outlive a session (e.g. the document manifest)
+DATA_DIR = os.environ.get("PLAYGROUND_DATA_DIR", ".playground_data")
+MANIFEST_PATH = os.path.join(DATA_DIR, "manifest.sqlite3")
+# GET responses kept across restarts and revalidated with 304s (see workato_api.DISK_CACHE_ENDPOINTS)
+HTTP_CACHE_PATH = os.path.join(DATA_DIR, "http_cache.sqlite3")
 
-BASE_URL = "https://apim.workato.com/workatop329/workato-chatapi-v1"
+############################################################
+# Response Cache
+############################################################
+# GET responses are cached per process and shared by every session using the
+# same API key, so a rerun (or a colleague) asking for the same thing does not
+# go back to the API. Writes clear the endpoints they affect (see
+# workato_api.ResponseCache for TTL and size defaults).
+# List endpoints are served stale-while-revalidate: for up to STALE_MAX_AGE_SECONDS
+# past the TTL the last good response comes back at once and a background thread
+# fetches a new one (endpoints in STALE_WHILE_REVALIDATE_ENDPOINTS, see workato_api).
+STALE_MAX_AGE_SECONDS = 15 * 60
+# How often a session checks whether newer list data has arrived
+NEWER_DATA_POLL_SECONDS = 10
+# Search results are cached separately; uploading to a KB clears that KB's results
+SEARCH_CACHE_TTL_SECONDS = 600
+SEARCH_CACHE_MAX_ENTRIES = 256
+# Tool results reused across sessions with the same API key, when a session opts in
+# (TTLs come from each function, see workato_api.tool_result_ttl)
+TOOL_RESULT_CACHE_MAX_ENTRIES = 1024
+# Hybrid search: how many candidates per requested result each search fetches (fused with
+# workato_api.reciprocal_rank_fusion)
+HYBRID_CANDIDATE_FACTOR = 2
+
+
+############################################################
+# Instrumentation
+############################################################
+# Recent calls kept for the diagnostics panel, and timing samples kept per endpoint / section
+METRICS_MAX_CALLS = 1000
+METRICS_LATENCY_SAMPLES = 500
+METRICS_QUANTILES = (0.5, 0.95, 0.99)
+# If set, Prometheus text is written here after every rerun (e.g. for node_exporter's textfile collector)
+METRICS_FILE = os.environ.get("PLAYGROUND_METRICS_FILE", "")
+
+
+class ApiMetrics:
+    """
+    Process-wide record of API calls (latency, status, payload sizes, cache
+    outcome) and of section / rerun timings. Calls are tagged with the
+    section and rerun that made them through two context variables.
+    Exports as JSON or Prometheus text.
+    """
+    def __init__(self):
+        # Set on the script thread; in_current_context() carries them into worker threads
+        self.section = contextvars.ContextVar("section", default="")
+        self.rerun_id = contextvars.ContextVar("rerun_id", default="")
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=METRICS_MAX_CALLS)
+        # (method, endpoint) -> counters and recent latencies
+        self._endpoints = {}
+        # section name -> recent durations in seconds
+        self._sections = {}
+
+    def _endpoint_stats(self, method, endpoint):
+        key = (method, endpoint)
+        if key not in self._endpoints:
+            self._endpoints[key] = {
+                "requests": 0, "errors": 0, "seconds": 0.0, "bytes_sent": 0, "bytes_received": 0,
+                "cache_hit": 0, "cache_miss": 0, "cache_coalesced": 0, "cache_stale": 0, "statuses": {},
+                "latencies": deque(maxlen=METRICS_LATENCY_SAMPLES),
+            }
+        return self._endpoints[key]
+
+    def record_call(self, method, endpoint, status, seconds, bytes_sent, bytes_received):
+        """Record one upstream call. status is the HTTP status code, or "error" if no response came back."""
+        with self._lock:
+            self._calls.append({
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "rerun": self.rerun_id.get(), "section": self.section.get(),
+                # A string, like the "" of cache rows, so the calls table has one column type
+                "method": method, "endpoint": endpoint, "status": str(status), "cache": "",
+                "ms": round(seconds * 1000, 1), "bytes_sent": bytes_sent, "bytes_received": bytes_received,
+            })
+            stats = self._endpoint_stats(method, endpoint)
+            stats["requests"] += 1
+            stats["errors"] += 1 if status == "error" or status >= 400 else 0
+            stats["seconds"] += seconds
+            stats["bytes_sent"] += bytes_sent
+            stats["bytes_received"] += bytes_received
+            stats["statuses"][str(status)] = stats["statuses"].get(str(status), 0) + 1
+            stats["latencies"].append(seconds)
+
+    def record_cache(self, method, endpoint, outcome):
+        """Record a cache lookup made in front of the API: "hit", "miss", "coalesced" or "stale"."""
+        with self._lock:
+            stats = self._endpoint_stats(method, endpoint)
+            stats[f"cache_{outcome}"] += 1
+            if outcome != "miss":
+                # No upstream call of its own, so it gets its own row
+                self._calls.append({
+                    "time": datetime.now().isoformat(timespec="seconds"),
+                    "rerun": self.rerun_id.get(), "section": self.section.get(),
+                    "method": method, "endpoint": endpoint, "status": "", "cache": outcome,
+                    "ms": 0.0, "bytes_sent": 0, "bytes_received": 0,
+                })
+
+    def record_section(self, section, seconds):
+        with self._lock:
+            self._sections.setdefault(section, deque(maxlen=METRICS_LATENCY_SAMPLES)).append(seconds)
+
+    def calls(self, rerun_id=None):
+        with self._lock:
+            return [c for c in self._calls if rerun_id is None or c["rerun"] == rerun_id]
+
+    def snapshot(self):
+        """Everything recorded so far as JSON-serialisable data."""
+        with self._lock:
+            endpoints = []
+            for (method, endpoint), stats in sorted(self._endpoints.items()):
+                latencies = list(stats["latencies"])
+                row = {"method": method, "endpoint": endpoint}
+                row.update({k: v for k, v in stats.items() if k != "latencies"})
+                for q in METRICS_QUANTILES:
+                    row[f"p{int(q * 100)}_ms"] = round(quantile(latencies, q) * 1000, 1)
+                endpoints.append(row)
+            sections = {
+                name: {"count": len(samples),
+                       **{f"p{int(q * 100)}_ms": round(quantile(list(samples), q) * 1000, 1)
+                          for q in METRICS_QUANTILES}}
+                for name, samples in self._sections.items()
+            }
+            return {"endpoints": endpoints, "sections": sections, "recent_calls": list(self._calls)}
+
+    def prometheus(self):
+        """Prometheus text exposition of the counters and latency summaries."""
+        def labels(**kwargs):
+            return "{" + ",".join(f'{k}="{v}"' for k, v in kwargs.items()) + "}"
+
+        lines = [
+            "# HELP playground_api_requests_total Upstream API requests by status.",
+            "# TYPE playground_api_requests_total counter",
+        ]
+        with self._lock:
+            endpoints = [(key, dict(stats, latencies=list(stats["latencies"])))
+                         for key, stats in sorted(self._endpoints.items())]
+            sections = [(name, list(samples)) for name, samples in sorted(self._sections.items())]
+        for (method, endpoint), stats in endpoints:
+            for status, count in sorted(stats["statuses"].items()):
+                lines.append(f"playground_api_requests_total{labels(method=method, endpoint=endpoint, status=status)} {count}")
+        lines += ["# HELP playground_api_request_errors_total Upstream API requests that failed or returned >= 400.",
+                  "# TYPE playground_api_request_errors_total counter"]
+        for (method, endpoint), stats in endpoints:
+            lines.append(f"playground_api_request_errors_total{labels(method=method, endpoint=endpoint)} {stats['errors']}")
+        lines += ["# HELP playground_api_request_duration_seconds Upstream API latency (recent samples).",
+                  "# TYPE playground_api_request_duration_seconds summary"]
+        for (method, endpoint), stats in endpoints:
+            for q in METRICS_QUANTILES:
+                lines.append(f"playground_api_request_duration_seconds"
+                             f"{labels(method=method, endpoint=endpoint, quantile=q)} {quantile(stats['latencies'], q):.6f}")
+            lines.append(f"playground_api_request_duration_seconds_sum{labels(method=method, endpoint=endpoint)} {stats['seconds']:.6f}")
+            lines.append(f"playground_api_request_duration_seconds_count{labels(method=method, endpoint=endpoint)} {stats['requests']}")
+        lines += ["# HELP playground_api_bytes_total Request and response body bytes.",
+                  "# TYPE playground_api_bytes_total counter"]
+        for (method, endpoint), stats in endpoints:
+            lines.append(f"playground_api_bytes_total{labels(method=method, endpoint=endpoint, direction='sent')} {stats['bytes_sent']}")
+            lines.append(f"playground_api_bytes_total{labels(method=method, endpoint=endpoint, direction='received')} {stats['bytes_received']}")
+        lines += ["# HELP playground_cache_lookups_total Cache lookups in front of the API.",
+                  "# TYPE playground_cache_lookups_total counter"]
+        for (method, endpoint), stats in endpoints:
+            for outcome in ("hit", "miss", "coalesced", "stale"):
+                lines.append(f"playground_cache_lookups_total"
+                             f"{labels(method=method, endpoint=endpoint, outcome=outcome)} {stats[f'cache_{outcome}']}")
+        lines += ["# HELP playground_section_duration_seconds Script time per section and per rerun (recent samples).",
+                  "# TYPE playground_section_duration_seconds summary"]
+        for name, samples in sections:
+            for q in METRICS_QUANTILES:
+                lines.append(f"playground_section_duration_seconds{labels(section=name, quantile=q)} {quantile(samples, q):.6f}")
+            lines.append(f"playground_section_duration_seconds_count{labels(section=name)} {len(samples)}")
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedSession(requests.Session):
+    """A requests.Session that records every request it sends in an ApiMetrics."""
+    def __init__(self, metrics):
+        super().__init__()
+        self.metrics = metrics
+
+    def request(self, method, url, *args, **kwargs):
+        endpoint = url[len(BASE_URL):] if url.startswith(BASE_URL) else urlparse(url).path
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception:
+            sent = len(json.dumps(kwargs["json"])) if kwargs.get("json") is not None else 0
+            self.metrics.record_call(method.upper(), endpoint, "error", time.perf_counter() - started, sent, 0)
+            raise
+        body = response.request.body or b""
+        if getattr(response, "revalidated", False):
+            # Answered from the HTTP cache after a 304; nothing but headers came over the wire
+            status, received = 304, 0
+        else:
+            # Streamed bodies are still being read; count what the server announced
+            status = response.status_code
+            received = int(response.headers.get("Content-Length") or 0) if kwargs.get("stream") else len(response.content)
+        self.metrics.record_call(method.upper(), endpoint, status, time.perf_counter() - started, len(body), received)
+        return response
+
+
+############################################################
+# Document Manifest
+############################################################
+class DocumentManifest:
+    """
+    SQLite record of what this app has uploaded to each knowledge base:
+    content hash, size, number of parts and upload time per (account,
+    knowledge_base_id, document_id), so syncs can skip documents that have
+    not changed and re-uploads can clear parts they no longer use.
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    account TEXT NOT NULL,
+                    knowledge_base_id TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    uploaded_at TEXT NOT NULL,
+                    parts INTEGER,
+                    PRIMARY KEY (account, knowledge_base_id, document_id)
+                )
+                """
+            )
+            # Manifests from before part counts were recorded; their parts stay NULL
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(documents)")]
+            if "parts" not in columns:
+                self._conn.execute("ALTER TABLE documents ADD COLUMN parts INTEGER")
+
+    def get(self, account, knowledge_base_id, document_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, size, uploaded_at, parts FROM documents"
+                " WHERE account = ? AND knowledge_base_id = ? AND document_id = ?",
+                (account, knowledge_base_id, document_id)
+            ).fetchone()
+        return dict(zip(("sha256", "size", "uploaded_at", "parts"), row)) if row else None
+
+    def record(self, account, knowledge_base_id, document_id, sha256, size, parts):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (account, knowledge_base_id, document_id, sha256, size,"
+                " uploaded_at, parts) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (account, knowledge_base_id, document_id, sha256, size, datetime.now().isoformat(), parts)
+            )
+
+    def summary(self, account):
+        """Document count and total bytes per knowledge base."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT knowledge_base_id, COUNT(*), SUM(size) FROM documents"
+                " WHERE account = ? GROUP BY knowledge_base_id",
+                (account,)
+            ).fetchall()
+        return {kb_id: {"documents": count, "bytes": size} for kb_id, count, size in rows}
+
+
+def hash_file(fileobj, block_size=UPLOAD_PART_SIZE):
+    """SHA-256 of a binary file object, read in blocks; leaves it rewound."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(block_size), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+############################################################
+# Message Store
+############################################################
+@st.cache_resource
+def get_message_spill():
+    return MessageSpill()
+
+
+def new_message_store():
+    """An empty MessageStore for this session."""
+    return MessageStore(get_message_spill(), owner=st.session_state.session_key)
 
 ############################################################
 # Session State Initialization
 ############################################################
 def init_session_state():
+    # Identifies this session's message stores in the spill metrics
+    if 'session_key' not in st.session_state:
+        st.session_state.session_key = uuid.uuid4().hex[:8]
     if 'api_key' not in st.session_state:
         st.session_state.api_key = ""
     if 'current_chat_id' not in st.session_state:
@@ -28,20 +370,69 @@ def init_session_state():
         st.session_state.edit_agent_mode = False
     if 'edit_agent_data' not in st.session_state:
         st.session_state.edit_agent_data = {}
-    # For chat messages
+    # Agent list paging, plus the parsed agents of the last /agents response
+    if 'agent_page' not in st.session_state:
+        st.session_state.agent_page = 1
+    if 'agent_page_size' not in st.session_state:
+        st.session_state.agent_page_size = AGENT_PAGE_SIZES[0]
+    if 'agent_index' not in st.session_state:
+        st.session_state.agent_index = (None, [])
+    # Conversation list paging, plus each agent's chats sorted newest first
+    if 'chat_page' not in st.session_state:
+        st.session_state.chat_page = 1
+    if 'chat_page_size' not in st.session_state:
+        st.session_state.chat_page_size = CHAT_PAGE_SIZES[0]
+    if 'chat_index' not in st.session_state:
+        st.session_state.chat_index = {}
+    # For chat messages: the open conversation's MessageStore
     if 'messages' not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = new_message_store()
     # For Chat tab new flow
     # 'list' to show conversation list, 'details' to show a single conversation
     if 'chat_view' not in st.session_state:
         st.session_state.chat_view = 'list'
+    # Per chat: its MessageStore and how far its history has been synced,
+    # so history syncs only fetch new steps
+    if 'chat_steps' not in st.session_state:
+        st.session_state.chat_steps = {}
+    # Parts acknowledged per interrupted upload, so a retry can resume
+    if 'upload_parts' not in st.session_state:
+        st.session_state.upload_parts = {}
+    # Documents that failed in the last bulk upload, for retrying
+    if 'ingest_failures' not in st.session_state:
+        st.session_state.ingest_failures = {}
+    # Number of trailing messages shown in the conversation view
+    if 'chat_window' not in st.session_state:
+        st.session_state.chat_window = CHAT_WINDOW_SIZE
     # For Function Registries
+    # Registry whose swagger the user asked to download
+    if 'swagger_requested' not in st.session_state:
+        st.session_state.swagger_requested = None
     if 'selected_function_registry_id' not in st.session_state:
         st.session_state.selected_function_registry_id = None
     if 'function_registry_view' not in st.session_state:
         st.session_state.function_registry_view = 'list'
     if 'show_create_function_registry_modal' not in st.session_state:
         st.session_state.show_create_function_registry_modal = False
+    # Stream agent replies as they arrive instead of waiting for the full turn
+    if 'stream_chat' not in st.session_state:
+        st.session_state.stream_chat = False
+    # Reuse results of cacheable tool calls instead of running them again
+    if 'cache_tool_results' not in st.session_state:
+        st.session_state.cache_tool_results = False
+    # Only the selected section runs its API calls on a rerun
+    if 'active_section' not in st.session_state:
+        st.session_state.active_section = SECTIONS[0]
+    # Timing breakdown of this session's recent reruns, shown in the diagnostics panel
+    if 'show_diagnostics' not in st.session_state:
+        st.session_state.show_diagnostics = False
+    if 'rerun_history' not in st.session_state:
+        st.session_state.rerun_history = deque(maxlen=20)
+    if 'current_rerun' not in st.session_state:
+        st.session_state.current_rerun = None
+    # Cache versions of the list responses shown by the latest rerun (see remember_version)
+    if 'seen_versions' not in st.session_state:
+        st.session_state.seen_versions = {}
 
 
 init_session_state()
@@ -49,26 +440,571 @@ init_session_state()
 ############################################################
 # Helper function for API calls
 ############################################################
+# Worker threads shared by every session for concurrent API calls
+API_WORKERS = 16
+
+
+@st.cache_resource
+def get_api_metrics():
+    return ApiMetrics()
+
+
+@st.cache_resource
+def get_http_cache():
+    return HttpCache(HTTP_CACHE_PATH)
+
+
+@st.cache_resource
+def get_rate_limiter():
+    return RateLimiter()
+
+
+@st.cache_resource
+def get_http_client():
+    """
+    One pooled keep-alive session per process, shared by every session and
+    rerun. List GETs go through the on-disk HTTP cache, so after a restart
+    they cost a 304 rather than the full payload, and every call waits its
+    turn in the process-wide rate limiter.
+    """
+    return make_http_client(InstrumentedSession(get_api_metrics()), http_cache=get_http_cache(),
+                            limiter=get_rate_limiter())
+
+
+@st.cache_resource
+def get_document_manifest():
+    return DocumentManifest(MANIFEST_PATH)
+
+
+@st.cache_resource
+def get_response_cache():
+    """GET responses shared by every session; entries are keyed by API key fingerprint."""
+    return ResponseCache(max_stale=STALE_MAX_AGE_SECONDS)
+
+
+@st.cache_resource
+def get_search_cache():
+    """Semantic / Exact / Q&A results shared by every session; entries are keyed by API key fingerprint."""
+    return ResponseCache(ttl=SEARCH_CACHE_TTL_SECONDS, max_entries=SEARCH_CACHE_MAX_ENTRIES)
+
+
+@st.cache_resource
+def get_tool_result_cache():
+    """Results of cacheable tool calls, shared by every session; entries are keyed by API key fingerprint."""
+    return ResponseCache(max_entries=TOOL_RESULT_CACHE_MAX_ENTRIES)
+
+
+@st.cache_resource
+def get_function_catalog(account):
+    """One function catalog per account (API key fingerprint), shared by its sessions."""
+    return FunctionCatalog()
+
+
+@st.cache_resource
+def get_api_executor():
+    """Thread pool used to run independent API calls concurrently."""
+    return ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="api")
+
+
 def make_request(method, endpoint, data=None, params=None):
     """
     A helper function to make requests to the specified endpoint.
+    GET responses are served from the shared response cache when fresh;
+    writes clear the cached endpoints listed in CACHE_INVALIDATIONS.
+    """
+    result = api_request(get_http_client(), st.session_state.api_key, get_response_cache(),
+                         method, endpoint, data=data, params=params)
+    if method.upper() == "GET":
+        remember_version(endpoint, params)
+    return result
+
+
+def remember_version(endpoint, params):
+    """
+    Note which version of a list response this rerun showed, so that
+    newer_data_notice() can tell when a background refresh replaced it.
+    """
+    if endpoint in STALE_WHILE_REVALIDATE_ENDPOINTS:
+        key = ResponseCache.make_key("GET", endpoint, params, st.session_state.api_key)
+        st.session_state.seen_versions[key] = get_response_cache().version(key)
+
+
+def prefetch(*calls):
+    """
+    Start GET requests for several endpoints at once so a view waits for its
+    slowest call rather than the sum of all of them. Each call is an endpoint
+    or an (endpoint, params) tuple. Returns Futures keyed by endpoint; cache
+    hits come back already resolved.
+    """
+    client = get_http_client()
+    api_key = st.session_state.api_key
+    cache = get_response_cache()
+    futures = {}
+    for call in calls:
+        endpoint, params = (call, None) if isinstance(call, str) else call
+        cached = cache.get(ResponseCache.make_key("GET", endpoint, params, api_key), count_miss=False)
+        if cached is not None:
+            client.metrics.record_cache("GET", endpoint, "hit")
+            futures[endpoint] = Future()
+            futures[endpoint].set_result(cached)
+            remember_version(endpoint, params)
+        else:
+            # api_request counts the miss (or joins a fetch already in flight)
+            futures[endpoint] = get_api_executor().submit(
+                in_current_context(api_request), client, api_key, cache, "GET", endpoint, params=params
+            )
+            if endpoint in STALE_WHILE_REVALIDATE_ENDPOINTS:
+                # Runs on the worker; only touches the dict, not Streamlit
+                seen = st.session_state.seen_versions
+                key = ResponseCache.make_key("GET", endpoint, params, api_key)
+                futures[endpoint].add_done_callback(lambda _, key=key: seen.__setitem__(key, cache.version(key)))
+    return futures
+
+
+def paginate(items, page, size, server_side, fetched=None):
+    """
+    Return (visible, page, page_count) for a paged list. page is clamped to
+    page_count. With server_side the server already returned just this page:
+    items is shown whole, and a next page is offered while the server filled
+    the page (fetched records, len(items) by default).
+    """
+    if server_side:
+        page_count = page + (1 if (len(items) if fetched is None else fetched) >= size else 0)
+    else:
+        page_count = max(1, -(-len(items) // size))
+    page = min(page, page_count)
+    if server_side:
+        return items, page, page_count
+    first = (page - 1) * size
+    return items[first:first + size], page, page_count
+
+
+def search_cache_key(search_type, query, knowledge_base_ids, num_results, api_key):
+    """
+    Key a search by type, normalized query, sorted KB ids and result count.
+    Whitespace is always collapsed; case is ignored except for Exact searches.
+    """
+    query = " ".join(query.split())
+    if search_type != "Exact":
+        query = query.lower()
+    return (search_type, query, tuple(sorted(knowledge_base_ids)), num_results, api_key_fingerprint(api_key))
+
+
+def invalidate_search_results(cache, knowledge_base_id, api_key):
+    """Drop every session's cached searches that included the given knowledge base of this account."""
+    account = api_key_fingerprint(api_key)
+    cache.invalidate_where(lambda key: knowledge_base_id in key[2] and key[4] == account)
+
+
+def iter_document_parts(fileobj, part_size=UPLOAD_PART_SIZE, repeat_header=False):
+    """
+    Read a binary file object in parts of about part_size bytes and yield
+    each as text. A part runs on to the next line break if that comes within
+    a quarter of part_size; otherwise (a long line, e.g. minified JSON) it is
+    cut at part_size, moved back to a UTF-8 character boundary. Either way a .json document
+    comes out in parts that are not valid JSON on their own. With
+    repeat_header the first line (a CSV header) starts every part.
+    """
+    fileobj.seek(0)
+    header = fileobj.readline() if repeat_header else b""
+    yielded = False
+    carry = b""
+    while True:
+        block = carry + fileobj.read(part_size - len(carry))
+        if not block:
+            break
+        limit = max(part_size // 4, 1)
+        rest = fileobj.readline(limit)
+        if len(rest) < limit or rest.endswith(b"\n"):
+            # The line (or the file) ends close enough
+            block, carry = block + rest, b""
+        else:
+            cut = utf8_boundary(block)
+            block, carry = block[:cut], block[cut:] + rest
+        yielded = True
+        yield (header + block).decode("utf-8")
+    if header and not yielded:
+        yield header.decode("utf-8")
+
+
+def utf8_boundary(data):
+    """len(data), or where the character left incomplete at the end of data starts."""
+    start = len(data) - 1
+    while start > 0 and len(data) - start < 4 and data[start] & 0xC0 == 0x80:
+        start -= 1
+    if start < 0 or data[start] < 0xC0:
+        return len(data)
+    length = 2 if data[start] < 0xE0 else 3 if data[start] < 0xF0 else 4
+    return start if start + length > len(data) else len(data)
+
+
+def document_part_id(document_id, number):
+    """KB document holding part `number` (from 1) of a file: the first part is the document itself."""
+    return document_id if number == 1 else f"{document_id}_part{number:04d}"
+
+
+def previous_part_ids(document_id, previous):
+    """
+    KB documents written by the upload recorded in the manifest entry
+    `previous` (None: nothing known). Entries from before part counts were
+    recorded used <document_id>_part0001 onwards for files over
+    UPLOAD_PART_SIZE; parts are at least that big, so ceil(size / part size)
+    bounds how many there were.
+    """
+    if previous is None:
+        return []
+    if previous["parts"] is not None:
+        return [document_part_id(document_id, n) for n in range(1, previous["parts"] + 1)]
+    if previous["size"] <= UPLOAD_PART_SIZE:
+        return [document_id]
+    return [f"{document_id}_part{n:04d}" for n in range(1, math.ceil(previous["size"] / UPLOAD_PART_SIZE) + 1)]
+
+
+def upload_document(client, api_key, cache, knowledge_base_id, document_id, fileobj, size,
+                    start_part=0, on_part=None, previous=None):
+    """
+    Upload a file with PUT /knowledge/document, read and sent one part of
+    about UPLOAD_PART_SIZE at a time so memory use stays flat. Part 1 is
+    the document <document_id> and further parts are <document_id>_partNNNN
+    (see document_part_id), whatever the file's size.
+    Parts before start_part were acknowledged by an earlier attempt and are
+    skipped. on_part(parts_done, bytes_read) is called after each part.
+    previous is the document's manifest entry from its last upload: parts of
+    that upload this one no longer writes are overwritten with empty
+    documents (the API has no delete), so old content stops matching searches.
+    Returns (parts_done, error), where error is None on success.
+    """
+    def put(doc_id, text):
+        resp = api_request(client, api_key, cache, "PUT", "/knowledge/document", data={
+            "document_id": doc_id,
+            "knowledge_base_id": knowledge_base_id,
+            "document": text
+        })
+        return resp.get("error") if isinstance(resp, dict) else None
+
+    repeat_header = str(getattr(fileobj, "name", "")).lower().endswith(".csv")
+    parts_done = start_part
+    parts = iter_document_parts(fileobj, UPLOAD_PART_SIZE, repeat_header) if size else iter([""])
+    for index, text in enumerate(parts):
+        if index < start_part:
+            continue
+        error = put(document_part_id(document_id, index + 1), text)
+        if error:
+            return parts_done, error
+        parts_done = index + 1
+        if on_part:
+            on_part(parts_done, fileobj.tell())
+    written = {document_part_id(document_id, n) for n in range(1, parts_done + 1)}
+    for stale_id in previous_part_ids(document_id, previous):
+        if stale_id not in written:
+            error = put(stale_id, "")
+            if error:
+                return parts_done, f"clearing old part {stale_id}: {error}"
+    return parts_done, None
+
+
+def document_id_from_filename(filename):
+    """Derive a document ID from a file name: extension dropped, special characters as underscores."""
+    raw_id = os.path.splitext(filename)[0]
+    return re.sub(r"[^a-zA-Z0-9_-]", "_", raw_id).strip("_")
+
+
+def make_ingest_items(sources):
+    """
+    Turn (name, size, opener) tuples into bulk ingestion items with unique
+    document IDs. opener() must return a context manager yielding a binary file.
+    """
+    items = []
+    used_ids = set()
+    for index, (name, size, opener) in enumerate(sources):
+        document_id = original_id = document_id_from_filename(name) or f"doc_{index + 1}"
+        suffix = 1
+        while document_id in used_ids:
+            document_id = f"{original_id}_{suffix}"
+            suffix += 1
+        used_ids.add(document_id)
+        items.append({"file": name, "document_id": document_id, "size": size, "open": opener})
+    return items
+
+
+def zip_ingest_sources(fileobj):
+    """List the supported documents in a zip archive as (name, size, opener) tuples."""
+    archive = zipfile.ZipFile(fileobj)
+    return [
+        (info.filename, info.file_size, lambda name=info.filename: archive.open(name))
+        for info in archive.infolist()
+        if not info.is_dir() and info.filename.rsplit(".", 1)[-1].lower() in DOCUMENT_EXTENSIONS
+    ]
+
+
+def directory_ingest_sources(directory):
+    """
+    List the supported documents under a server-side directory, which must be
+    inside INGEST_ROOT, as (relative path, size, opener) tuples.
+    """
+    root = os.path.realpath(INGEST_ROOT)
+    directory = os.path.realpath(os.path.join(root, directory))
+    if not INGEST_ROOT or os.path.commonpath([root, directory]) != root:
+        raise ValueError(f"Directory must be inside {INGEST_ROOT or 'PLAYGROUND_INGEST_ROOT'}")
+    sources = []
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            if filename.rsplit(".", 1)[-1].lower() not in DOCUMENT_EXTENSIONS:
+                continue
+            path = os.path.join(dirpath, filename)
+            sources.append((os.path.relpath(path, directory), os.path.getsize(path),
+                            lambda path=path: open(path, "rb")))
+    return sources
+
+
+def ingest_documents(client, api_key, cache, knowledge_base_id, items, manifest=None, skip_unchanged=True,
+                     workers=INGEST_WORKERS, rate=INGEST_RATE_PER_SECOND):
     """
-    headers = {"API-Token": st.session_state.api_key}
+    Upload many documents through a pool of `workers` threads, starting at
+    most `rate` uploads per second. Yields each item's result as it finishes:
+    the item's file, document_id and size plus "status", "error" and "seconds".
+    With a manifest, successful uploads are recorded and parts left over from
+    a document's previous upload are cleared; with skip_unchanged too,
+    documents whose content hash matches the last upload are skipped
+    (status "unchanged").
+    """
+    account = api_key_fingerprint(api_key)
+    interval = 1.0 / rate if rate else 0
+    schedule_lock = threading.Lock()
+    next_start = [time.monotonic()]
+
+    def wait_for_slot():
+        if interval:
+            with schedule_lock:
+                start_at = max(next_start[0], time.monotonic())
+                next_start[0] = start_at + interval
+            time.sleep(max(0, start_at - time.monotonic()))
+
+    def run(item):
+        started = time.monotonic()
+        status = "uploaded"
+        try:
+            with item["open"]() as fileobj:
+                content_hash = hash_file(fileobj) if manifest else None
+                previous = manifest.get(account, knowledge_base_id, item["document_id"]) if manifest else None
+                if skip_unchanged and previous and previous["sha256"] == content_hash:
+                    status, error = "unchanged", None
+                else:
+                    # Only uploads count against the rate; skipped documents go straight through
+                    wait_for_slot()
+                    parts, error = upload_document(client, api_key, cache, knowledge_base_id,
+                                                   item["document_id"], fileobj, item["size"], previous=previous)
+                    if manifest and not error:
+                        manifest.record(account, knowledge_base_id, item["document_id"], content_hash,
+                                        item["size"], parts)
+        except Exception as e:
+            error = str(e)
+        return {
+            "file": item["file"],
+            "document_id": item["document_id"],
+            "size": item["size"],
+            "status": "failed" if error else status,
+            "error": error or "",
+            "seconds": round(time.monotonic() - started, 2),
+        }
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+    try:
+        futures = [pool.submit(in_current_context(run), item) for item in items]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Don't block a rerun on uploads that have not started yet
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def stream_chat_send(client, api_key, cache, payload):
+    """
+    POST /agents/chats/send asking for a server-sent event stream, and yield
+    ("chat_id", id), ("text", fragment) and ("item", agent_response) events
+    as they arrive. Each SSE data line is a JSON object that may carry
+    "chat_id", a text "delta" and/or an "agent_response" list; "[DONE]" ends
+    the stream. A plain JSON reply is translated into the same events, so
+    this also works against an API that does not stream.
+    """
+    def split_item(item):
+        # Text goes out as a fragment; whatever else the item carries (tool calls) as an item
+        if item.get("content"):
+            yield ("text", item["content"])
+        rest = {k: v for k, v in item.items() if k != "content"}
+        if rest.get("tool_call_id"):
+            yield ("item", rest)
+
     try:
-        response = requests.request(
-            method=method,
-            url=f"{BASE_URL}{endpoint}",
-            headers=headers,
-            json=data,
-            params=params
+        response = client.post(
+            f"{BASE_URL}/agents/chats/send",
+            headers={"API-Token": api_key, "Accept": "text/event-stream"},
+            json=payload,
+            stream=True,
+            timeout=REQUEST_TIMEOUT
         )
-        return response.json() if response.content else {}
+        with response:
+            if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                body = response.json() if response.content else {}
+                if "chat_id" in body:
+                    yield ("chat_id", body["chat_id"])
+                for item in body.get("agent_response", []):
+                    yield from split_item(item)
+                if "error" in body:
+                    yield ("text", f"Error: {body['error']}")
+                return
+
+            data_lines = []
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].strip())
+                    continue
+                if line or not data_lines:
+                    continue
+                # A blank line ends the event
+                data = "\n".join(data_lines)
+                data_lines = []
+                if data == "[DONE]":
+                    return
+                event = json.loads(data)
+                if event.get("chat_id"):
+                    yield ("chat_id", event["chat_id"])
+                if event.get("delta"):
+                    yield ("text", event["delta"])
+                for item in event.get("agent_response", []):
+                    yield from split_item(item)
     except Exception as e:
-        return {"error": str(e)}
+        yield ("text", f"Error: {str(e)}")
+    finally:
+        cache.invalidate(CACHE_INVALIDATIONS[("POST", "/agents/chats/send")], api_key)
+
+
+def start_rerun():
+    """Tag this rerun's API calls with a fresh rerun id and start its clock."""
+    rerun_id = uuid.uuid4().hex[:8]
+    get_api_metrics().rerun_id.set(rerun_id)
+    st.session_state.current_rerun = {"id": rerun_id, "started": time.perf_counter(),
+                                      "sections": [], "open": None}
+
+
+def mark_section(name):
+    """Close the running section's timer and start one for name."""
+    rerun = st.session_state.current_rerun
+    now = time.perf_counter()
+    if rerun["open"]:
+        section, started = rerun["open"]
+        rerun["sections"].append((section, now - started))
+        get_api_metrics().record_section(section, now - started)
+    rerun["open"] = (name, now) if name else None
+    get_api_metrics().section.set(name or "")
+
+
+def finish_rerun():
+    """Record the rerun's total and section breakdown. Reruns cut short by st.rerun() are not recorded."""
+    mark_section(None)
+    rerun = st.session_state.current_rerun
+    total = time.perf_counter() - rerun["started"]
+    metrics = get_api_metrics()
+    metrics.record_section("rerun", total)
+    st.session_state.rerun_history.append({"id": rerun["id"], "seconds": total, "sections": rerun["sections"]})
+    if METRICS_FILE:
+        write_metrics_file()
+
+
+@st.cache_resource
+def get_metrics_file_lock():
+    return threading.Lock()
+
+
+def write_metrics_file():
+    """
+    Replace METRICS_FILE with the current Prometheus text. Each write goes to
+    its own temporary file that is then renamed over METRICS_FILE, so a
+    scraper never reads half a file, and the lock keeps sessions finishing
+    at the same time from interleaving. A failed export never fails the rerun.
+    """
+    with get_metrics_file_lock():
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(os.path.abspath(METRICS_FILE)),
+                                             prefix=os.path.basename(METRICS_FILE) + ".", suffix=".tmp",
+                                             delete=False) as f:
+                temp_path = f.name
+                f.write(prometheus_text())
+            os.replace(temp_path, METRICS_FILE)
+        except OSError as e:
+            print(f"Could not write {METRICS_FILE}: {e}", file=sys.stderr)
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def prometheus_text():
+    """Prometheus text for everything the process measures."""
+    return (get_api_metrics().prometheus() + get_message_spill().prometheus() + get_http_cache().prometheus()
+            + get_rate_limiter().prometheus())
+
+
+def render_diagnostics():
+    """Sidebar panel: where the last rerun spent its time, its API calls, and per-endpoint totals."""
+    metrics = get_api_metrics()
+    last = st.session_state.rerun_history[-1]
+    calls = metrics.calls(last["id"])
+    upstream = [c for c in calls if not c["cache"]]
+    memory_bytes, spilled_bytes = get_message_spill().session_bytes().get(st.session_state.session_key, (0, 0))
+    with st.expander("Diagnostics", expanded=True):
+        st.write(f"Last rerun: {last['seconds'] * 1000:.0f} ms, {len(upstream)} API calls "
+                 f"({sum(c['ms'] for c in upstream):.0f} ms), {len(calls) - len(upstream)} answered from cache")
+        st.write(f"Chat messages: {memory_bytes / 1024:.0f} KB in memory "
+                 f"(budget {SESSION_MESSAGE_BUDGET_BYTES / 1024:.0f} KB per session), "
+                 f"{spilled_bytes / 1024:.0f} KB spilled to disk")
+        http_cache = get_http_cache().stats()
+        st.write(f"HTTP cache: {http_cache['entries']} responses ({http_cache['bytes'] / 1024:.0f} KB) on disk, "
+                 f"{http_cache['revalidated']} revalidated with a 304")
+        limiter = get_rate_limiter().stats()
+        st.write(f"Rate limiter: {limiter['in_flight']} of {limiter['limit']} calls in flight, "
+                 f"{limiter['queued']} waiting, "
+                 f"{sum(e['throttled'] for e in limiter['endpoints'].values())} throttled (429) since the server started")
+        st.dataframe([{"section": name, "ms": round(seconds * 1000, 1)} for name, seconds in last["sections"]],
+                     hide_index=True)
+        if calls:
+            st.markdown("**Calls this rerun**")
+            st.dataframe([{k: c[k] for k in ("section", "method", "endpoint", "status", "cache", "ms")} for c in calls],
+                         hide_index=True)
+        snapshot = metrics.snapshot()
+        if snapshot["endpoints"]:
+            st.markdown("**All calls since the server started**")
+            st.dataframe([
+                {"endpoint": f"{e['method']} {e['endpoint']}", "calls": e["requests"], "errors": e["errors"],
+                 "p50 ms": e["p50_ms"], "p95 ms": e["p95_ms"],
+                 "KB in": round(e["bytes_received"] / 1024, 1), "cache hits": e["cache_hit"],
+                 "stale": e["cache_stale"]}
+                for e in snapshot["endpoints"]
+            ], hide_index=True)
+        st.download_button("Export JSON", json.dumps(snapshot, indent=2),
+                           file_name="playground_metrics.json", mime="application/json")
+        st.download_button("Export Prometheus", prometheus_text(),
+                           file_name="playground_metrics.prom", mime="text/plain")
+
+
+@st.fragment(run_every=NEWER_DATA_POLL_SECONDS)
+def newer_data_notice():
+    """
+    Re-run on its own every NEWER_DATA_POLL_SECONDS (without the rest of the
+    page) and offer a reload once a background refresh has replaced a list
+    this page is showing.
+    """
+    cache = get_response_cache()
+    if any(cache.version(key) > seen for key, seen in list(st.session_state.seen_versions.items())):
+        if st.button("🔄 Newer data available - reload", key="reload_newer_data"):
+            st.rerun()
 
 ############################################################
 # UI Layout
 ############################################################
+start_rerun()
+# Filled in again by this rerun's list requests
+st.session_state.seen_versions = {}
+mark_section("Sidebar")
 # Sidebar
 with st.sidebar:
     st.header("API Configuration")
@@ -78,18 +1014,28 @@ with st.sidebar:
     st.markdown("**Current Session**")
     st.write(f"Active Chat: {st.session_state.current_chat_id or 'None'}")
     st.write(f"Selected Agent: {st.session_state.selected_agent_id or 'None'}")
+    st.checkbox("Stream chat responses", key="stream_chat",
+                help="Show the agent's reply and tool calls as they happen. Needs an API that streams /agents/chats/send.")
+    st.checkbox("Cache tool results", key="cache_tool_results",
+                help="Reuse the result of an identical earlier call to a GET function, or to one its registry marks "
+                     "cacheable, instead of calling the API behind it again.")
+    st.checkbox("Show diagnostics", key="show_diagnostics",
+                help="Timing of each rerun and the API calls it made.")
+    if st.session_state.api_key:
+        newer_data_notice()
 
 ############################################################
 # Landing Page when API key is missing
 ############################################################
 if not st.session_state.api_key:
+    mark_section("Landing")
     st.title("Workato Copilot Playground")
     st.markdown(
         """
         ## Welcome! 
         To get started:
         1. Enter your API key in the sidebar 🔑  
-        2. Select a feature from the tabs above 👆  
+        2. Select a feature from the menu above 👆  
         3. Start interacting with the APIs 🚀
         
         *Contact Bennett if you need an API key*
@@ -99,23 +1045,35 @@ if not st.session_state.api_key:
 
 else:
     ############################################################
-    # Main Tabs (only show if we have an API key)
+    # Main Navigation (only show if we have an API key)
     ############################################################
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Agents", "Chat", "Functions", "Knowledge Bases", "Search"])
+    # Unlike st.tabs, only the selected section's body (and its API calls) runs on a rerun
+    st.radio("Section", SECTIONS, key="active_section", horizontal=True, label_visibility="collapsed")
+    mark_section(st.session_state.active_section)
 
     ############################################################
     # Tab 1 - Agent Management
     ############################################################
-    with tab1:
+    if st.session_state.active_section == "Agents":
         st.header("Agent Management")
         st.info("Give your agent instructions, knowledge and functions. Then chat with it in the next tab.")
 
-        # Fetch all agents
-        agents_response = make_request("GET", "/agents")
+        # Fetch agents, function registries (for the picklist) and, if the
+        # agent form is open, knowledge bases, all at once
+        agent_view_calls = ["/functions"]
+        if AGENTS_SERVER_PAGINATION:
+            agent_view_calls.append(("/agents", {"page": st.session_state.agent_page,
+                                                 "limit": st.session_state.agent_page_size}))
+        else:
+            agent_view_calls.append("/agents")
+        if st.session_state.show_create_agent_modal:
+            agent_view_calls.append("/knowledge")
+        agent_view_data = prefetch(*agent_view_calls)
+
+        agents_response = agent_view_data["/agents"].result()
         agent_records = agents_response.get("Records", [])
 
-        # Also fetch function registries for picklist
-        func_registries_resp = make_request("GET", "/functions")
+        func_registries_resp = agent_view_data["/functions"].result()
         registry_list = func_registries_resp.get("function_registries", [])
         # We'll store them as { ID: ID } for a selectbox, or { ID: Name } if you have a name field
         registry_map = {}
@@ -144,38 +1102,75 @@ else:
             st.session_state.edit_agent_mode = False
             st.session_state.edit_agent_data = {}
 
-        with st.expander("View / Update Agents"):
-            if agent_records:
-                for agent in agent_records:
+        def get_agent_index(response):
+            """
+            Parse an /agents response once into display rows; reruns that get
+            the same (cached) response object reuse the parsed rows.
+            """
+            source, index = st.session_state.agent_index
+            if source is not response:
+                index = []
+                for agent in response.get("Records", []):
                     kb_list = parse_agent_knowledge(agent)
-                    with st.container():
-                        col1, col2 = st.columns([5,3])
-                        with col1:
-                            st.markdown(f"**Name**: {agent.get('Agent_Name', '')}")
-                            st.markdown(f"**ID**: {agent.get('Agent_ID', '')}")
-                            st.markdown(f"**Description**: {agent.get('description', '')}")
-                            st.markdown(f"**Instruction**: {agent.get('instruction', '')}")
-                            if kb_list:
-                                st.markdown(f"**Knowledge Bases**: {', '.join(kb_list)}")
-                            else:
-                                st.markdown("**Knowledge Bases**: None")
-                            # If you show function_registry_id, you can do so here:
-                            fr_id = agent.get("functions", None)
-                            st.markdown(f"**Function Registry**: {fr_id if fr_id else 'None'}")
-                        with col2:
-                            if st.button("Edit", key=f"edit_{agent['Agent_ID']}"):
-                                open_create_agent_modal(
-                                    edit=True,
-                                    agent_data={
-                                        'agent_id': agent.get('Agent_ID', ''),
-                                        'agent_name': agent.get('Agent_Name', ''),
-                                        'agent_description': agent.get('description', ''),
-                                        'agent_instruction': agent.get('instruction', ''),
-                                        'knowledge_bases': kb_list,
-                                        'functions': agent.get("functions", "")
-                                    }
-                                )
-                        st.markdown("---")
+                    row = {
+                        "Name": agent.get('Agent_Name', ''),
+                        "ID": agent.get('Agent_ID', ''),
+                        "Description": agent.get('description', ''),
+                        "Instruction": agent.get('instruction', ''),
+                        "Knowledge Bases": ", ".join(kb_list) if kb_list else "None",
+                        "Function Registry": agent.get("functions") or "None",
+                    }
+                    # Fields can be null or numeric in the API's JSON; show and search them as text
+                    row = {k: str(v or "") for k, v in row.items()}
+                    index.append({
+                        "row": row,
+                        "search_text": " ".join(row.values()).lower(),
+                        "edit_data": {
+                            'agent_id': agent.get('Agent_ID', ''),
+                            'agent_name': agent.get('Agent_Name', ''),
+                            'agent_description': agent.get('description', ''),
+                            'agent_instruction': agent.get('instruction', ''),
+                            'knowledge_bases': kb_list,
+                            'functions': agent.get("functions", "")
+                        }
+                    })
+                st.session_state.agent_index = (response, index)
+            return index
+
+        with st.expander("View / Update Agents"):
+            if agent_records or st.session_state.agent_page > 1:
+                agent_index = get_agent_index(agents_response)
+                agent_filter = st.text_input("Filter agents", key="agent_filter",
+                                             placeholder="Name, ID, description, knowledge base...")
+                if agent_filter:
+                    terms = agent_filter.lower().split()
+                    matching = [a for a in agent_index if all(t in a["search_text"] for t in terms)]
+                else:
+                    matching = agent_index
+
+                visible, st.session_state.agent_page, page_count = paginate(
+                    matching, st.session_state.agent_page, st.session_state.agent_page_size,
+                    AGENTS_SERVER_PAGINATION, fetched=len(agent_records))
+
+                col_size, col_page = st.columns(2)
+                with col_size:
+                    st.selectbox("Agents per page", AGENT_PAGE_SIZES, key="agent_page_size")
+                with col_page:
+                    st.number_input("Page", min_value=1, max_value=page_count, key="agent_page")
+
+                st.dataframe([a["row"] for a in visible], hide_index=True)
+                st.caption(f"Page {st.session_state.agent_page} of {page_count}, "
+                           f"{len(visible)} of {len(matching)} agents shown")
+
+                if visible:
+                    edit_choice = st.selectbox(
+                        "Agent to edit",
+                        options=range(len(visible)),
+                        format_func=lambda i: f"{visible[i]['row']['Name']} ({visible[i]['row']['ID']})",
+                        key="agent_to_edit"
+                    )
+                    if st.button("Edit", key="edit_agent"):
+                        open_create_agent_modal(edit=True, agent_data=visible[edit_choice]["edit_data"])
             else:
                 st.info("No agents found.")
 
@@ -206,7 +1201,10 @@ else:
                 )
 
                 # Knowledge base selection
-                kbs_response = make_request("GET", "/knowledge")
+                if "/knowledge" in agent_view_data:
+                    kbs_response = agent_view_data["/knowledge"].result()
+                else:
+                    kbs_response = make_request("GET", "/knowledge")
                 kb_options = [kb.get("knowledge_base_id", "") for kb in kbs_response.get("knowledge_bases", [])]
 
                 selected_kbs = st.multiselect(
@@ -253,28 +1251,113 @@ else:
     ############################################################
     # Tab 2 - Chat Interface
     ############################################################
-    with tab2:
+    if st.session_state.active_section == "Chat":
         st.header("Chat Interface")
 
         # Helper: load conversation
         def load_conversation(chat_id):
-            history = make_request("GET", "/agents/chats/history", params={"chat_id": chat_id})
-            st.session_state.messages = []
+            """
+            Fetch only the steps newer than the last one synced for this chat
+            and append them to its MessageStore. Messages added locally since
+            the last sync are dropped first; the history has the server's copy.
+            """
+            cached = st.session_state.chat_steps.get(chat_id)
+            if cached is None:
+                cached = st.session_state.chat_steps[chat_id] = {
+                    "store": new_message_store(), "synced": 0, "since": "", "since_ids": set()
+                }
+            params = {"chat_id": chat_id}
+            if cached["since"]:
+                params[HISTORY_SINCE_PARAM] = cached["since"]
+            history = make_request("GET", "/agents/chats/history", params=params)
+            store = cached["store"]
+            store.truncate(cached["synced"])
             for step in history.get("steps", []):
+                created_at = step.get("created_at", "")
+                step_id = step.get("id") or (created_at, json.dumps(step.get("payload"), sort_keys=True))
+                # Older steps are already stored; only ids at the newest timestamp are needed to drop repeats
+                if created_at < cached["since"] or (created_at == cached["since"] and step_id in cached["since_ids"]):
+                    continue
+                if created_at > cached["since"]:
+                    cached["since"], cached["since_ids"] = created_at, set()
+                cached["since_ids"].add(step_id)
                 role = "user" if step["payload"].get("step_type") == "user_message" else "assistant"
-                st.session_state.messages.append({
+                store.append({
                     "role": role,
                     "content": step["payload"].get("content", ""),
-                    "timestamp": step.get("created_at", "")
+                    "timestamp": created_at
                 })
+            cached["synced"] = len(store)
+            # Only the open conversation keeps messages in memory, including
+            # stores left by "Start New Conversation" and back_to_list
+            for other in get_message_spill().owner_stores(st.session_state.session_key):
+                if other is not store:
+                    other.spill_oldest()
+
+            st.session_state.chat_window = CHAT_WINDOW_SIZE
+            st.session_state.messages = store
 
         def back_to_list():
             st.session_state.chat_view = 'list'
             st.session_state.current_chat_id = None
-            st.session_state.messages = []
-
-        # Always get agents for the dropdown
-        agents_for_chat = make_request("GET", "/agents")
+            st.session_state.messages = new_message_store()
+            st.session_state.chat_window = CHAT_WINDOW_SIZE
+
+        def load_earlier_messages():
+            st.session_state.chat_window += CHAT_WINDOW_SIZE
+
+        def chat_list_params(agent_id):
+            params = {"agent_id": agent_id}
+            if CHATS_SERVER_PAGINATION:
+                params.update(page=st.session_state.chat_page, limit=st.session_state.chat_page_size)
+            return params
+
+        def get_chat_index(agent_id, response):
+            """
+            The agent's chats, newest first. Sorted once per /agents/chats
+            response; reruns that get the same (cached) response reuse it.
+            """
+            source, chats = st.session_state.chat_index.get(agent_id, (None, []))
+            if source is not response:
+                chats = sorted(response.get("Records", []), key=lambda c: str(c.get("Created_at") or ""),
+                               reverse=True)
+                st.session_state.chat_index[agent_id] = (response, chats)
+            return chats
+
+        def add_chat_to_index(agent_id, chat_id):
+            """
+            Put a chat this session just started at the top of the agent's
+            conversation list, in the shared response cache and in this
+            session's index, instead of listing the agent's chats again.
+            """
+            cache = get_response_cache()
+            if CHATS_SERVER_PAGINATION:
+                # Every page shifts by one; list them again
+                cache.invalidate(["/agents/chats"], st.session_state.api_key)
+                return
+            key = ResponseCache.make_key("GET", "/agents/chats", chat_list_params(agent_id), st.session_state.api_key)
+            cached = cache.get(key, count_miss=False)
+            if cached is None or any(c.get("chat_id") == chat_id for c in cached.get("Records", [])):
+                return
+            # Same UTC ISO format as the server's Created_at, so the newest-first order holds
+            record = {"chat_id": chat_id, "Created_at": datetime.now(timezone.utc).isoformat()}
+            updated = dict(cached, Records=[record] + cached.get("Records", []))
+            cache.set(key, updated)
+            source, chats = st.session_state.chat_index.get(agent_id, (None, []))
+            if source is cached:
+                st.session_state.chat_index[agent_id] = (updated, [record] + chats)
+
+        def reset_chat_page():
+            st.session_state.chat_page = 1
+
+        # Always get agents for the dropdown. In the list view, fetch the
+        # selected agent's conversations alongside them.
+        chat_view_calls = ["/agents"]
+        if st.session_state.chat_view == 'list' and st.session_state.get("chat_agent") not in (None, "None"):
+            chat_view_calls.append(("/agents/chats", chat_list_params(st.session_state.chat_agent)))
+        chat_view_data = prefetch(*chat_view_calls)
+
+        agents_for_chat = chat_view_data["/agents"].result()
         agent_list_dropdown = {
             a.get("Agent_ID", ""): a.get("Agent_Name", "Unknown") 
             for a in agents_for_chat.get("Records", [])
@@ -289,6 +1372,8 @@ else:
                 "Select Agent",
                 options=["None"] + list(agent_list_dropdown.keys()),
                 format_func=lambda x: agent_list_dropdown.get(x, x) if x != "None" else "Select an Agent",
+                key="chat_agent",
+                on_change=reset_chat_page,
             )
 
             if selected_agent == "None":
@@ -305,23 +1390,53 @@ else:
                     if st.button("Start New Conversation"):
                         st.session_state.chat_view = 'details'
                         st.session_state.current_chat_id = None
-                        st.session_state.messages = []
+                        st.session_state.messages = new_message_store()
                         st.rerun()
 
-                    # Get existing chats
-                    conv_response = make_request("GET", "/agents/chats", params={"agent_id": selected_agent})
-                    chat_records = conv_response.get("Records", [])
+                    # Get existing chats (already prefetched above, except on first selection)
+                    if "/agents/chats" in chat_view_data:
+                        conv_response = chat_view_data["/agents/chats"].result()
+                    else:
+                        conv_response = make_request("GET", "/agents/chats", params=chat_list_params(selected_agent))
+                    chat_index = get_chat_index(selected_agent, conv_response)
 
-                    if chat_records:
+                    if chat_index or st.session_state.chat_page > 1:
                         st.write("### Past Conversations")
-                        for c in chat_records:
+                        col_find, col_dates = st.columns(2)
+                        with col_find:
+                            chat_filter = st.text_input("Find chat id", key="chat_filter", on_change=reset_chat_page)
+                        with col_dates:
+                            chat_dates = st.date_input("Created between", value=[], key="chat_dates",
+                                                       on_change=reset_chat_page)
+                        matching = chat_index
+                        if chat_filter.strip():
+                            # Ids may come back as numbers
+                            matching = [c for c in matching if chat_filter.strip() in str(c["chat_id"])]
+                        if chat_dates:
+                            # A single date (while the range is being picked) means that day
+                            first_day, last_day = chat_dates[0].isoformat(), chat_dates[-1].isoformat()
+                            matching = [c for c in matching if first_day <= str(c.get("Created_at") or "")[:10] <= last_day]
+
+                        visible, st.session_state.chat_page, page_count = paginate(
+                            matching, st.session_state.chat_page, st.session_state.chat_page_size,
+                            CHATS_SERVER_PAGINATION, fetched=len(chat_index))
+                        for c in visible:
                             chat_id = c["chat_id"]
-                            chat_label = f"Chat {chat_id} ({c['Created_at']})"
+                            chat_label = f"Chat {chat_id} ({c.get('Created_at') or ''})"
                             if st.button(chat_label, key=f"chat_{chat_id}"):
                                 st.session_state.current_chat_id = chat_id
                                 load_conversation(chat_id)
                                 st.session_state.chat_view = 'details'
                                 st.rerun()
+
+                        col_size, col_page = st.columns(2)
+                        with col_size:
+                            st.selectbox("Chats per page", CHAT_PAGE_SIZES, key="chat_page_size",
+                                         on_change=reset_chat_page)
+                        with col_page:
+                            st.number_input("Page", min_value=1, max_value=page_count, key="chat_page")
+                        st.caption(f"Page {st.session_state.chat_page} of {page_count}, "
+                                   f"{len(visible)} of {len(matching)} conversations shown")
                     else:
                         st.info("No past conversations for this agent.")
 
@@ -333,8 +1448,12 @@ else:
                     else:
                         st.subheader("New Conversation")
 
-                    # Display existing messages
-                    for message in st.session_state.messages:
+                    # Display the most recent messages; older ones are paged in on demand
+                    hidden_count = len(st.session_state.messages) - st.session_state.chat_window
+                    if hidden_count > 0:
+                        st.button(f"Load earlier messages ({hidden_count} more)",
+                                  on_click=load_earlier_messages, key="load_earlier")
+                    for message in st.session_state.messages[-st.session_state.chat_window:]:
                         with st.chat_message(message["role"]):
                             st.markdown(message["content"])
                             if message.get("timestamp"):
@@ -364,105 +1483,105 @@ else:
                         }
                         if st.session_state.current_chat_id:
                             payload["chat_id"] = st.session_state.current_chat_id
+                        tool_cache = get_tool_result_cache() if st.session_state.cache_tool_results else None
+
+                        if st.session_state.stream_chat:
+                            with st.chat_message("user"):
+                                st.markdown(prompt)
+                            # Render text as it arrives and keep the rest of the events
+                            response = {"agent_response": []}
+
+                            def text_fragments():
+                                for kind, value in stream_chat_send(get_http_client(), st.session_state.api_key,
+                                                                    get_response_cache(), payload):
+                                    if kind == "text":
+                                        yield value
+                                    elif kind == "chat_id":
+                                        response["chat_id"] = value
+                                    else:
+                                        response["agent_response"].append(value)
+
+                            with st.chat_message("assistant"):
+                                streamed_text = st.write_stream(text_fragments())
+                                if streamed_text:
+                                    st.session_state.messages.append({
+                                        "role": "assistant",
+                                        "content": streamed_text,
+                                        "timestamp": datetime.now().isoformat()
+                                    })
+                                if "chat_id" in response and not st.session_state.current_chat_id:
+                                    st.session_state.current_chat_id = response["chat_id"]
+                                    add_chat_to_index(selected_agent, response["chat_id"])
+                                if response["agent_response"]:
+                                    with st.status("Running tools...", expanded=True) as tool_status:
+                                        st.session_state.messages.extend(process_agent_responses(
+                                            get_http_client(),
+                                            st.session_state.api_key,
+                                            get_response_cache(),
+                                            selected_agent,
+                                            st.session_state.current_chat_id,
+                                            response["agent_response"],
+                                            on_progress=tool_status.write,
+                                            tool_cache=tool_cache
+                                        ))
+                                        tool_status.update(label="Tools finished", state="complete")
+                            st.rerun()
 
                         response = make_request("POST", "/agents/chats/send", data=payload)
 
-                        if "agent_response" in response:
-                            # Put the initial list of agent responses in a variable
-                            agent_responses = response["agent_response"]
-
-                            # Loop until there are no more agent_responses left to process
-                            while agent_responses:
-                                new_agent_responses = []
-
-                                # Process each response in this batch
-                                for resp in agent_responses:
-                                    # 1) If this response has plain text content, show it
-                                    if resp.get("content", ""):
-                                        st.session_state.messages.append({
-                                            "role": "assistant",
-                                            "content": resp.get("content", ""),
-                                            "timestamp": datetime.now().isoformat()
-                                        })
-
-                                    # 2) Check for a tool call
-                                    tool_call_id = resp.get("tool_call_id", "")
-                                    tool_call_name = resp.get("tool_call_name", "")
-                                    if tool_call_id:
-                                        tool_payload = {
-                                            "verb": resp.get("APIM_VERB", ""),
-                                            "endpoint": resp.get("APIM_ENDPOINT", ""),
-                                            "tool_call_id": tool_call_id,
-                                            "tool_call_name": tool_call_name,
-                                            "args": resp.get("args", ""),
-                                            "function_registry_id": resp.get("Function_registry_id", "")
-                                        }
-                                        
-                                        # Execute the tool call (in your example, we mock a response)
-                                        tool_response = make_request("POST", "/tools/execute", data=tool_payload)
-                                        # tool_response = ["confluence"]  # placeholder or real response
-
-                                        # Send the tool result back to the conversation
-                                        send_tool_resp_payload = {
-                                            "agent_id": selected_agent,
-                                            "chat_id": st.session_state.current_chat_id,
-                                            "user_email": "user@example.com",
-                                            "incoming_steps": [
-                                                {
-                                                    "payload": {
-                                                        "step_type": "tool_execution_response",
-                                                        "tool_call_id": f"{tool_call_id}",
-                                                        "content": f"{tool_response}"
-                                                    }
-                                                }
-                                            ]
-                                        }
-                                        followup_response = make_request("POST", "/agents/chats/send", data=send_tool_resp_payload)
-
-                                        # Locally display that the function was called
-                                        st.session_state.messages.append({
-                                            "role": "assistant",
-                                            "content": f"`Executed function - {tool_call_name}`",
-                                            "timestamp": datetime.now().isoformat()
-                                        })
-
-                                        # 3) The follow-up may include further agent_responses (tool calls, text, etc.)
-                                        #    Collect them to process on the next iteration
-                                        if "agent_response" in followup_response:
-                                            new_agent_responses.extend(followup_response["agent_response"])
-
-                                # Update agent_responses with all new ones discovered on this pass
-                                agent_responses = new_agent_responses
-
-                        # If new chat, store chat ID
+                        # If new chat, store chat ID so tool results go to the same chat
                         if "chat_id" in response and not st.session_state.current_chat_id:
                             st.session_state.current_chat_id = response["chat_id"]
+                            add_chat_to_index(selected_agent, response["chat_id"])
+
+                        if "agent_response" in response:
+                            st.session_state.messages.extend(process_agent_responses(
+                                get_http_client(),
+                                st.session_state.api_key,
+                                get_response_cache(),
+                                selected_agent,
+                                st.session_state.current_chat_id,
+                                response["agent_response"],
+                                tool_cache=tool_cache
+                            ))
 
                         st.rerun()
 
     ############################################################
     # Tab 3 - Function Registries
     ############################################################
-    with tab3:
+    if st.session_state.active_section == "Functions":
         st.header("Function Registries")
 
         def load_function_registries():
             return make_request("GET", "/functions")
 
         def load_function_registry_swagger(function_registry_id):
-            return requests.request(
-                method="GET",
-                url=f"{BASE_URL}/functions/swagger",
-                headers={"API-Token": st.session_state.api_key},
-                params={"function_registry_id": function_registry_id}
-            )
+            """
+            Download a registry's swagger as bytes, or None on failure. The HTTP
+            cache revalidates a stored copy, so an unchanged swagger costs a 304.
+            """
+            try:
+                response = get_http_client().get(
+                    f"{BASE_URL}/functions/swagger",
+                    headers={"API-Token": st.session_state.api_key},
+                    params={"function_registry_id": function_registry_id},
+                    timeout=REQUEST_TIMEOUT
+                )
+            except Exception:
+                return None
+            if not response.ok:
+                return None
+            return response.content
+
         def load_registry_functions(registry_id):
-            # new function to get function list
-            return make_request("GET", "/functions/function-list", params={"function_registry_id": registry_id})
+            # new function to get function list; returns a Future
+            return prefetch(("/functions/function-list", {"function_registry_id": registry_id}))["/functions/function-list"]
 
         def back_to_registry_list():
             st.session_state.function_registry_view = 'list'
             st.session_state.selected_function_registry_id = None
+            st.session_state.swagger_requested = None
 
         # create function registry modal triggers
         def open_create_function_registry_modal():
@@ -479,6 +1598,38 @@ else:
             registry_response = load_function_registries()
             registry_list = registry_response.get("function_registries", [])
 
+            # Search every registry's functions at once instead of opening each one
+            catalog_query = st.text_input(
+                "Search functions across all registries",
+                key="catalog_query",
+                placeholder="e.g. create ticket, POST, /users"
+            )
+            if catalog_query:
+                catalog = get_function_catalog(api_key_fingerprint(st.session_state.api_key))
+                catalog_client = get_http_client()
+                catalog_api_key = st.session_state.api_key
+                # The listing shown above may be a stale-while-revalidate copy; the catalog
+                # compares updated_at against a fresh one (revalidated by the HTTP cache)
+                catalog_listing, listed = send_request(catalog_client, catalog_api_key, None, "GET", "/functions")
+                if not listed:
+                    # Refreshing against an empty listing would drop every registry
+                    error = catalog_listing.get("error", "") if isinstance(catalog_listing, dict) else ""
+                    st.warning(f"Could not list registries; searching the catalog as last loaded. {error}")
+                else:
+                    with st.spinner("Updating function catalog..."):
+                        catalog.refresh(
+                            catalog_listing.get("function_registries", []),
+                            lambda rid: api_request(catalog_client, catalog_api_key, None, "GET",
+                                                    "/functions/function-list",
+                                                    params={"function_registry_id": rid}),
+                            get_api_executor()
+                        )
+                catalog_matches = catalog.search(catalog_query)
+                st.caption(f"{len(catalog_matches)} of {len(catalog)} functions match")
+                if catalog_matches:
+                    st.dataframe(catalog_matches, hide_index=True)
+                st.divider()
+
             if not registry_list:
                 st.info("No function registries found.")
             else:
@@ -540,23 +1691,29 @@ else:
             st.button("← Back", on_click=back_to_registry_list, key="back_registry")
             st.subheader(f"Function Registry Details: {registry_id}") 
 
-            # Display a download link for swagger
+            # The swagger can be several MB, so it is only fetched when asked for
             if registry_id:
-                swagger_response = load_function_registry_swagger(registry_id)
-                if swagger_response.ok:
-                    try:
-                        # It's possible the swagger is a raw JSON
-                        swagger_text = swagger_response.text
-                        # Provide a download button
-                        b64 = base64.b64encode(swagger_text.encode()).decode()
-                        href = f'<a href="data:application/json;base64,{b64}" download="{registry_id}_swagger.json">Download Swagger</a>'
-                        st.markdown(href, unsafe_allow_html=True)
-                    except Exception as e:
-                        st.error(f"Error processing swagger: {str(e)}")
-                else:
-                    st.warning("Unable to load swagger for this registry.")
+                function_list_future = load_registry_functions(registry_id)
+                if st.session_state.swagger_requested != registry_id:
+                    if st.button("Prepare Swagger Download", key="prepare_swagger"):
+                        st.session_state.swagger_requested = registry_id
+                if st.session_state.swagger_requested == registry_id:
+                    # Not kept in memory: each rerun revalidates the on-disk copy (a 304 when
+                    # unchanged), so a swagger changed by another session is never served stale
+                    swagger_bytes = load_function_registry_swagger(registry_id)
+                    if swagger_bytes is not None:
+                        st.download_button(
+                            "Download Swagger",
+                            data=swagger_bytes,
+                            file_name=f"{registry_id}_swagger.json",
+                            mime="application/json",
+                            key="download_swagger"
+                        )
+                    else:
+                        st.session_state.swagger_requested = None
+                        st.warning("Unable to load swagger for this registry.")
 
-                function_list_resp = load_registry_functions(registry_id)
+                function_list_resp = function_list_future.result()
                 if "chat_functions" in function_list_resp:
                     st.write("### Functions in this registry")
                     for fn_obj in function_list_resp["chat_functions"]:
@@ -577,7 +1734,7 @@ else:
     ############################################################
     # Tab 4 - Knowledge Bases
     ############################################################
-    with tab4:
+    if st.session_state.active_section == "Knowledge Bases":
         st.header("Knowledge Base Management")
 
         with st.expander("Create Knowledge Base"):
@@ -615,11 +1772,12 @@ else:
                 format_func=lambda x: kb_options_map[x] if x in kb_options_map else "Unknown"
             )
 
-            existing_docs = []  # placeholder
+            manifest = get_document_manifest()
+            account = api_key_fingerprint(st.session_state.api_key)
 
             uploaded_file = st.file_uploader(
                 "Upload your file",
-                type=["txt","json", "csv"],
+                type=DOCUMENT_EXTENSIONS,
                 accept_multiple_files=False,
                 help="Filename will be used as document ID (special characters converted to underscores). No pdfs for now."
             )
@@ -632,68 +1790,203 @@ else:
                     if custom_id:
                         document_id = custom_id
                     else:
-                        raw_id = os.path.splitext(uploaded_file.name)[0]
-                        document_id = re.sub(r"[^a-zA-Z0-9_-]", "_", raw_id).strip("_")
+                        document_id = document_id_from_filename(uploaded_file.name)
                         if not document_id:
                             document_id = f"doc_{int(time.time())}"
 
-                    suffix = 1
-                    original_id = document_id
-                    while any(d.get("document_id") == document_id for d in existing_docs):
-                        document_id = f"{original_id}_{suffix}"
-                        suffix += 1
+                    # Same ID and same content as the last upload: nothing to send
+                    content_hash = hash_file(uploaded_file)
+                    previous = manifest.get(account, selected_kb_id, document_id)
+                    if previous and previous["sha256"] == content_hash:
+                        st.info(f"`{document_id}` is unchanged since {previous['uploaded_at']}; skipped upload.")
+                    else:
+                        # Large files go up in parts; remember acknowledged parts so a retry resumes
+                        upload_key = (selected_kb_id, document_id, content_hash)
+                        start_part = st.session_state.upload_parts.get(upload_key, 0)
+                        progress_bar = None
+                        if uploaded_file.size > UPLOAD_PART_SIZE:
+                            progress_bar = st.progress(0.0, text="Uploading in parts...")
+                            if start_part:
+                                st.info(f"Resuming after part {start_part}.")
+
+                        def record_part(parts_done, bytes_read):
+                            st.session_state.upload_parts[upload_key] = parts_done
+                            if progress_bar:
+                                progress_bar.progress(min(bytes_read / uploaded_file.size, 1.0),
+                                                      text=f"Uploaded part {parts_done}")
+
+                        parts_done, error = upload_document(
+                            get_http_client(),
+                            st.session_state.api_key,
+                            get_response_cache(),
+                            selected_kb_id,
+                            document_id,
+                            uploaded_file,
+                            uploaded_file.size,
+                            start_part=start_part,
+                            on_part=record_part,
+                            previous=previous
+                        )
+
+                        if not error:
+                            st.session_state.upload_parts.pop(upload_key, None)
+                            manifest.record(account, selected_kb_id, document_id, content_hash, uploaded_file.size,
+                                            parts_done)
+                            invalidate_search_results(get_search_cache(), selected_kb_id, st.session_state.api_key)
+                            parts_note = f"  \n🧩 Parts: {parts_done}" if uploaded_file.size > UPLOAD_PART_SIZE else ""
+                            st.success(f"""
+                                **Upload successful!**  
+                                📁 File: {uploaded_file.name}  
+                                🏷️ Document ID: `{document_id}`{parts_note}
+                            """)
+                            st.balloons()
+                        elif parts_done:
+                            # The parts that went up are already searchable
+                            invalidate_search_results(get_search_cache(), selected_kb_id, st.session_state.api_key)
+                            st.error(f"Upload stopped after part {parts_done}: {error}. Press Upload again to resume.")
+                        else:
+                            st.error(f"Upload failed: {error}")
+                except Exception as e:
+                    st.error(f"Error processing ZIP file: {str(e)}")
 
-                    file_contents = uploaded_file.getvalue().decode("utf-8")
+        with st.expander("Bulk Upload"):
+            bulk_kb_id = st.selectbox(
+                "Select KB",
+                options=list(kb_options_map.keys()),
+                format_func=lambda x: kb_options_map[x] if x in kb_options_map else "Unknown",
+                key="bulk_kb"
+            )
+            bulk_sources = ["Files", "Zip archive"] + (["Server directory"] if INGEST_ROOT else [])
+            bulk_source = st.radio("Source", bulk_sources, horizontal=True, key="bulk_source")
 
-                    resp = make_request(
-                        "PUT",
-                        "/knowledge/document",
-                        data={
-                            "document_id": document_id,
-                            "knowledge_base_id": selected_kb_id,
-                            "document": file_contents
-                        }
+            bulk_items = []
+            try:
+                if bulk_source == "Files":
+                    bulk_files = st.file_uploader("Upload your files", type=DOCUMENT_EXTENSIONS,
+                                                  accept_multiple_files=True, key="bulk_files")
+                    bulk_items = make_ingest_items(
+                        (f.name, f.size, lambda f=f: nullcontext(f)) for f in bulk_files or []
                     )
+                elif bulk_source == "Zip archive":
+                    bulk_zip = st.file_uploader("Upload a zip archive", type=["zip"], key="bulk_zip")
+                    if bulk_zip is not None:
+                        bulk_items = make_ingest_items(zip_ingest_sources(bulk_zip))
+                else:
+                    bulk_dir = st.text_input(f"Directory (relative to {INGEST_ROOT})", key="bulk_dir")
+                    if bulk_dir:
+                        bulk_items = make_ingest_items(directory_ingest_sources(bulk_dir))
+            except Exception as e:
+                st.error(f"Error reading source: {str(e)}")
+
+            if bulk_items:
+                st.caption(f"{len(bulk_items)} documents, {sum(i['size'] for i in bulk_items) / 1e6:.1f} MB")
+            bulk_sync = st.checkbox("Skip documents unchanged since their last upload", value=True, key="bulk_sync")
+
+            def run_bulk_ingestion(knowledge_base_id, items):
+                progress_bar = st.progress(0.0, text="Starting...")
+                stats = st.empty()
+                status_table = st.empty()
+                results = []
+                started = time.monotonic()
+                uploaded_bytes = 0
+                last_refresh = 0
+                for result in ingest_documents(get_http_client(), st.session_state.api_key,
+                                               get_response_cache(), knowledge_base_id, items,
+                                               manifest=get_document_manifest(), skip_unchanged=bulk_sync):
+                    results.append(result)
+                    if result["status"] == "uploaded":
+                        uploaded_bytes += result["size"]
+                    elapsed = max(time.monotonic() - started, 1e-6)
+                    progress_bar.progress(len(results) / len(items), text=f"{len(results)} / {len(items)}")
+                    # Redrawing thousands of rows per file is slow; refresh a few times a second
+                    if time.monotonic() - last_refresh > 0.5 or len(results) == len(items):
+                        last_refresh = time.monotonic()
+                        stats.write(f"**{len(results) / elapsed:.1f} docs/s**, "
+                                    f"**{uploaded_bytes / elapsed / 1e6:.2f} MB/s**")
+                        status_table.dataframe(results, hide_index=True)
+                # Failed documents may have had some of their parts written
+                if any(r["status"] != "unchanged" for r in results):
+                    invalidate_search_results(get_search_cache(), knowledge_base_id, st.session_state.api_key)
+                failed_ids = {r["document_id"] for r in results if r["status"] == "failed"}
+                st.session_state.ingest_failures = {
+                    "knowledge_base_id": knowledge_base_id,
+                    "items": [i for i in items if i["document_id"] in failed_ids],
+                }
+                unchanged = [r for r in results if r["status"] == "unchanged"]
+                if unchanged:
+                    st.info(f"Skipped {len(unchanged)} unchanged documents, "
+                            f"saving {sum(r['size'] for r in unchanged) / 1e6:.2f} MB of uploads.")
+                if failed_ids:
+                    st.error(f"{len(failed_ids)} of {len(items)} documents failed.")
+                else:
+                    st.success(f"Uploaded {len(items) - len(unchanged)} documents.")
 
-                    if not resp.get("error"):
-                        st.success(f"""
-                            **Upload successful!**  
-                            📁 File: {uploaded_file.name}  
-                            🏷️ Document ID: `{document_id}`
-                        """)
-                        st.balloons()
-                    else:
-                        st.error(f"Upload failed: {resp.get('error', 'Unknown error')}")
-                except Exception as e:
-                    st.error(f"Error processing ZIP file: {str(e)}")
+            if st.button("📤 Start Bulk Upload", disabled=not bulk_items):
+                run_bulk_ingestion(bulk_kb_id, bulk_items)
+
+            failures = st.session_state.ingest_failures
+            if failures.get("items"):
+                st.write("**Failed documents**")
+                st.dataframe([{"file": i["file"], "document_id": i["document_id"]} for i in failures["items"]],
+                             hide_index=True)
+                if st.button(f"🔁 Retry {len(failures['items'])} failed"):
+                    run_bulk_ingestion(failures["knowledge_base_id"], failures["items"])
 
         with st.expander("View Knowledge Bases"):
             kbs_view_data = make_request("GET", "/knowledge")
+            uploaded_summary = get_document_manifest().summary(api_key_fingerprint(st.session_state.api_key))
             if kbs_view_data.get("knowledge_bases"):
                 for kb in kbs_view_data["knowledge_bases"]:
                     st.write(f"**{kb['name']}** ({kb['knowledge_base_id']})")
                     st.write(kb.get("description", ""))
+                    if kb["knowledge_base_id"] in uploaded_summary:
+                        kb_uploads = uploaded_summary[kb["knowledge_base_id"]]
+                        st.caption(f"{kb_uploads['documents']} documents "
+                                   f"({kb_uploads['bytes'] / 1e6:.2f} MB) uploaded from this app")
                     st.markdown("---")
 
     ############################################################
     # Tab 5 - Search
     ###########################################################
-    with tab5:
+    if st.session_state.active_section == "Search":
         st.header("Knowledge Search")
 
         kb_all_data = make_request("GET", "/knowledge")
         kb_ids = [kb["knowledge_base_id"] for kb in kb_all_data.get("knowledge_bases", [])]
 
-        search_type = st.radio("Search Type", ["Semantic", "Exact", "Q&A"], horizontal=True)
+        search_type = st.radio("Search Type", ["Semantic", "Exact", "Hybrid", "Q&A"], horizontal=True)
         selected_kbs_for_search = st.multiselect("Select Knowledge Bases", options=kb_ids, default=kb_ids)
 
+        # Captured here so cached_search can also run on worker threads
+        search_client = get_http_client()
+        search_api_key = st.session_state.api_key
+        search_cache = get_search_cache()
+        search_response_cache = get_response_cache()
+
+        def cached_search(kind, endpoint, query, data, num_results=None):
+            """POST a search unless the same search was answered recently."""
+            key = search_cache_key(kind, query, selected_kbs_for_search, num_results, search_api_key)
+            response = search_cache.get(key)
+            search_client.metrics.record_cache("POST", endpoint, "miss" if response is None else "hit")
+            if response is None:
+                # An upload finishing while this search runs makes its result out of date
+                generation = search_cache.generation(key)
+                response, ok = send_request(search_client, search_api_key, search_response_cache,
+                                            "POST", endpoint, data=data)
+                # Error statuses carry no "error" key ({"message": ...}); only cache real answers
+                if ok:
+                    search_cache.set(key, response, generation=generation)
+            return response
+
         if search_type == "Semantic":
             query = st.text_input("Search Query")
             num_results = st.number_input("Number of Results", value=3)
             if st.button("Search"):
-                response = make_request(
-                    "POST",
+                response = cached_search(
+                    "Semantic",
                     "/knowledge/documents/semantic",
+                    query,
+                    num_results=num_results,
                     data={
                         "query": query,
                         "knowledge_base_ids_to_query": selected_kbs_for_search,
@@ -708,9 +2001,11 @@ else:
             text = st.text_input("Exact Text")
             num_results = st.number_input("Number of Results", value=3)
             if st.button("Search"):
-                response = make_request(
-                    "POST",
+                response = cached_search(
+                    "Exact",
                     "/knowledge/documents/exact",
+                    text,
+                    num_results=num_results,
                     data={
                         "text": text,
                         "knowledge_base_ids_to_query": selected_kbs_for_search,
@@ -721,12 +2016,46 @@ else:
                     st.write(f"**KB:** {chunk['knowledge_base_id']}")
                     st.write(chunk.get("content", ""))
 
+        elif search_type == "Hybrid":
+            query = st.text_input("Search Query")
+            num_results = st.number_input("Number of Results", value=3)
+            if st.button("Search"):
+                # Run Semantic and Exact at the same time, then fuse their rankings
+                candidates = int(num_results) * HYBRID_CANDIDATE_FACTOR
+                semantic_future = get_api_executor().submit(
+                    in_current_context(cached_search), "Semantic", "/knowledge/documents/semantic", query,
+                    num_results=candidates,
+                    data={
+                        "query": query,
+                        "knowledge_base_ids_to_query": selected_kbs_for_search,
+                        "number_of_chunks_to_retrieve": candidates
+                    }
+                )
+                exact_future = get_api_executor().submit(
+                    in_current_context(cached_search), "Exact", "/knowledge/documents/exact", query,
+                    num_results=candidates,
+                    data={
+                        "text": query,
+                        "knowledge_base_ids_to_query": selected_kbs_for_search,
+                        "num_of_chunks_to_retrieve": candidates
+                    }
+                )
+                fused_chunks = reciprocal_rank_fusion(
+                    [semantic_future.result().get("retrieved_chunks", []),
+                     exact_future.result().get("retrieved_chunks", [])],
+                    int(num_results)
+                )
+                for chunk in fused_chunks:
+                    st.write(f"**KB:** {chunk['knowledge_base_id']}")
+                    st.write(chunk.get("content", ""))
+
         else:  # Q&A
             question = st.text_input("Question")
             if st.button("Ask"):
-                response = make_request(
-                    "POST",
+                response = cached_search(
+                    "Q&A",
                     "/knowledge/documents/ask",
+                    question,
                     data={
                         "knowledge_base_ids_reto_query": selected_kbs_for_search,
                         "question": question
@@ -734,5 +2063,12 @@ else:
                 )
                 st.write(f"**Answer:** {response.get('answer', 'No answer found')}")
 
+        st.caption(f"Search cache: {search_cache.hits} hits, {search_cache.misses} misses")
+
     st.markdown("---")
     st.caption("Workato Copilot Playground | Created with Streamlit and Deepseek :-) ")
+
+finish_rerun()
+if st.session_state.show_diagnostics:
+    with st.sidebar:
+        render_diagnostics()
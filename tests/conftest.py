@@ -0,0 +1,24 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_server  # noqa: E402
+import workato_api  # noqa: E402
+
+
+@pytest.fixture
+def api_server(monkeypatch):
+    """mock_server.py on a free port, with workato_api pointed at it."""
+    mock_server.seed()
+    server = mock_server.make_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(workato_api, "BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    mock_server.REQUEST_LOG.clear()
+    yield mock_server
+    server.shutdown()
+    server.server_close()
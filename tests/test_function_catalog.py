@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from workato_api import FunctionCatalog
+
+
+def listing(**registries):
+    return [{"function_registry_id": rid, "updated_at": updated_at} for rid, updated_at in registries.items()]
+
+
+def functions(*specs):
+    return {"chat_functions": [
+        {"chat_function": {"name": name, "description": description,
+                           "internal_metadata": {"verb": verb, "apim_endpoint": endpoint}}}
+        for name, description, verb, endpoint in specs
+    ]}
+
+
+REGISTRIES = {
+    "crm": functions(("get_user", "Fetch one user", "GET", "/users/{id}"),
+                     ("list_users", "All users", "GET", "/users"),
+                     ("create_ticket", "Open a support ticket", "POST", "/tickets")),
+    "billing": functions(("get_invoice", "Fetch an invoice", "GET", "/invoices/{id}")),
+}
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+@pytest.fixture
+def catalog(executor):
+    catalog = FunctionCatalog()
+    catalog.refresh(listing(crm="1", billing="1"), REGISTRIES.__getitem__, executor)
+    return catalog
+
+
+def names(matches):
+    return sorted(m["name"] for m in matches)
+
+
+def test_a_word_matches_as_a_substring_wherever_it_is_indexed(catalog):
+    assert names(catalog.search("use")) == ["get_user", "list_users"]
+    assert names(catalog.search("user")) == ["get_user", "list_users"]
+    assert names(catalog.search("users")) == ["get_user", "list_users"]
+
+
+def test_every_word_must_match(catalog):
+    assert names(catalog.search("get fetch")) == ["get_invoice", "get_user"]
+    assert names(catalog.search("post ticket")) == ["create_ticket"]
+    assert names(catalog.search("oi")) == ["get_invoice"]
+    assert catalog.search("get nothing") == []
+
+
+def test_refresh_only_fetches_changed_registries_and_drops_removed_ones(catalog, executor):
+    fetched = []
+
+    def fetch(rid):
+        fetched.append(rid)
+        return REGISTRIES[rid]
+
+    assert catalog.refresh(listing(crm="1", billing="1"), fetch, executor) == 0
+    assert catalog.refresh(listing(crm="2"), fetch, executor) == 1
+    assert fetched == ["crm"]
+    assert len(catalog) == 3
+    assert catalog.search("invoice") == []
+
+
+def test_failed_fetch_keeps_the_old_entry(catalog, executor):
+    catalog.refresh(listing(crm="2", billing="1"), lambda rid: {"error": "down"}, executor)
+    assert len(catalog) == 4
+    fetched = []
+    catalog.refresh(listing(crm="2", billing="1"), lambda rid: fetched.append(rid) or REGISTRIES[rid], executor)
+    assert fetched == ["crm"]
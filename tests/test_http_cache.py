@@ -0,0 +1,38 @@
+import workato_api
+from workato_api import HttpCache, api_request, make_http_client
+
+
+def test_304_is_answered_from_the_stored_body(api_server, tmp_path):
+    http_cache = HttpCache(str(tmp_path / "http_cache.sqlite3"))
+    client = make_http_client(http_cache=http_cache)
+    params = {"function_registry_id": "mock-registry"}
+
+    first = api_request(client, "key", None, "GET", "/functions/swagger", params=params)
+    second = api_request(client, "key", None, "GET", "/functions/swagger", params=params)
+
+    assert "error" not in first
+    assert second == first
+    assert http_cache.stats()["revalidated"] == 1
+    assert [path for _, path in api_server.REQUEST_LOG].count("/functions/swagger") == 2
+
+
+def test_revalidated_response_looks_like_a_200(api_server, tmp_path):
+    client = make_http_client(http_cache=HttpCache(str(tmp_path / "http_cache.sqlite3")))
+    url = f"{workato_api.BASE_URL}/functions/swagger"
+    params = {"function_registry_id": "mock-registry"}
+    body = client.get(url, params=params, headers={"API-Token": "key"}).content
+
+    response = client.get(url, params=params, headers={"API-Token": "key"})
+    assert response.status_code == 200
+    assert response.revalidated
+    assert response.content == body
+    assert response.headers["Content-Length"] == str(len(body))
+
+
+def test_cache_is_kept_per_api_key(api_server, tmp_path):
+    http_cache = HttpCache(str(tmp_path / "http_cache.sqlite3"))
+    client = make_http_client(http_cache=http_cache)
+    params = {"function_registry_id": "mock-registry"}
+    api_request(client, "key", None, "GET", "/functions/swagger", params=params)
+    api_request(client, "other key", None, "GET", "/functions/swagger", params=params)
+    assert http_cache.stats()["revalidated"] == 0
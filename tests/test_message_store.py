@@ -0,0 +1,87 @@
+import gc
+
+import pytest
+
+from workato_api import MessageSpill, MessageStore
+
+
+def fill(store, count, prefix="m"):
+    store.extend({"role": "user", "content": f"{prefix}{i}" + "x" * 200} for i in range(count))
+
+
+def contents(messages):
+    return [m.content.rstrip("x") for m in messages]
+
+
+@pytest.fixture
+def spill():
+    return MessageSpill()
+
+
+def test_old_messages_spill_and_the_newest_stay_in_memory(spill):
+    store = MessageStore(spill, budget=2000)
+    fill(store, 30)
+    assert len(store) == 30
+    assert 0 < store.bytes <= 2000
+    assert 0 < store._spilled < 30
+
+
+def test_slices_read_across_the_spill_boundary(spill):
+    store = MessageStore(spill, budget=2000)
+    fill(store, 30)
+    boundary = store._spilled
+    expected = [f"m{i}" for i in range(30)]
+    assert contents(store[:]) == expected
+    assert contents(store[boundary - 3:boundary + 3]) == expected[boundary - 3:boundary + 3]
+    assert contents(store[-5:]) == expected[-5:]
+    assert contents(store[:2]) == expected[:2]
+    assert contents(store[::7]) == expected[::7]
+    assert store[5:5] == []
+    assert contents([store[0], store[boundary], store[-1]]) == ["m0", expected[boundary], "m29"]
+
+
+def test_out_of_range_index_raises_index_error(spill):
+    store = MessageStore(spill)
+    fill(store, 3)
+    with pytest.raises(IndexError):
+        store[3]
+    with pytest.raises(IndexError):
+        store[-4]
+
+
+def test_truncate_drops_spilled_and_in_memory_messages(spill):
+    store = MessageStore(spill, budget=2000)
+    fill(store, 30)
+    store.truncate(4)
+    assert contents(store) == ["m0", "m1", "m2", "m3"]
+    store.append({"role": "assistant", "content": "new"})
+    assert contents(store[-2:]) == ["m3", "new"]
+
+
+def test_budget_is_shared_by_the_stores_of_one_owner(spill):
+    older = MessageStore(spill, budget=3000, owner="session")
+    fill(older, 10)
+    other_session = MessageStore(spill, budget=3000, owner="other")
+    fill(other_session, 10)
+    current = MessageStore(spill, budget=3000, owner="session")
+    fill(current, 10)
+    assert older.bytes == 0
+    assert older.bytes + current.bytes <= 3000
+    assert other_session.bytes > 0
+    assert contents(older) == [f"m{i}" for i in range(10)]
+
+
+def test_rows_of_a_collected_store_are_deleted(spill):
+    store = MessageStore(spill, budget=0, owner="session")
+    fill(store, 5)
+    del store
+    gc.collect()
+    MessageStore(spill, budget=0).append({"role": "user", "content": "next"})
+    assert spill._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 1
+
+
+def test_null_content_is_stored_as_empty_text(spill):
+    store = MessageStore(spill, budget=0)
+    store.append({"role": "assistant", "content": None, "timestamp": "2024-01-01T00:00:00"})
+    assert store[0].content == ""
+    assert store[0]["timestamp"].startswith("2024-01-01")
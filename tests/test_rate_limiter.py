@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from workato_api import RateLimiter
+
+
+def test_admits_burst_then_paces_at_rate():
+    limiter = RateLimiter(rate=50, burst=5, endpoint_limits={})
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire("/agents")
+        limiter.release("/agents", 200, 0.01)
+    assert time.monotonic() - started < 0.05
+    for _ in range(5):
+        limiter.acquire("/agents")
+        limiter.release("/agents", 200, 0.01)
+    # Five tokens past the burst take about 5 / 50 seconds
+    assert time.monotonic() - started >= 0.08
+
+
+def test_endpoint_budget_only_applies_to_its_endpoint():
+    limiter = RateLimiter(rate=0, endpoint_limits={"/tools/execute": (1, 1)}, max_wait=0.2)
+    limiter.acquire("/tools/execute")
+    limiter.release("/tools/execute", 200, 0.01)
+    limiter.acquire("/agents")
+    limiter.release("/agents", 200, 0.01)
+    with pytest.raises(TimeoutError):
+        limiter.acquire("/tools/execute")
+
+
+def test_waits_for_a_slot_when_at_the_concurrency_limit():
+    limiter = RateLimiter(rate=0, endpoint_limits={}, concurrency=1)
+    limiter.acquire("/agents")
+    admitted = threading.Event()
+
+    def second():
+        limiter.acquire("/agents")
+        admitted.set()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not admitted.wait(0.1)
+    assert limiter.stats()["queued"] == 1
+    limiter.release("/agents", 200, 0.01)
+    assert admitted.wait(1)
+    thread.join()
+
+
+def test_429_halves_the_limit_once_per_burst_and_pauses():
+    limiter = RateLimiter(rate=0, endpoint_limits={}, concurrency=16)
+    for _ in range(3):
+        limiter.acquire("/agents")
+    for _ in range(3):
+        limiter.release("/agents", 429, 0.01, retry_after=0.2)
+    assert limiter.limit == 8
+    assert limiter.stats()["endpoints"]["/agents"]["throttled"] == 3
+    started = time.monotonic()
+    limiter.acquire("/agents")
+    assert time.monotonic() - started >= 0.15
+
+
+def test_limit_grows_back_after_a_window_of_good_responses():
+    limiter = RateLimiter(rate=0, endpoint_limits={}, concurrency=4, max_concurrency=5)
+    for _ in range(4):
+        limiter.acquire("/agents")
+        limiter.release("/agents", 200, 0.01)
+    assert limiter.limit == 5
+    for _ in range(10):
+        limiter.acquire("/agents")
+        limiter.release("/agents", 200, 0.01)
+    assert limiter.limit == 5
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from workato_api import ResponseCache
+
+
+def key(endpoint="/agents", api_key="key"):
+    return ResponseCache.make_key("GET", endpoint, None, api_key)
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(1)
+        return "value", True
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch(key(), fetch)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.coalesced < 7:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(outcome for _, outcome in results) == ["coalesced"] * 7 + ["miss"]
+    assert {value for value, _ in results} == {"value"}
+    assert cache.get_or_fetch(key(), fetch) == ("value", "hit")
+
+
+def test_failed_fetch_is_not_stored():
+    cache = ResponseCache()
+    assert cache.get_or_fetch(key(), lambda: ({"error": "boom"}, False)) == ({"error": "boom"}, "miss")
+    assert cache.get(key()) is None
+
+
+def test_stale_entry_is_served_while_it_refreshes():
+    cache = ResponseCache(ttl=0.05, max_stale=10)
+    cache.set(key(), "old")
+    time.sleep(0.1)
+    refreshed = threading.Event()
+
+    def fetch():
+        refreshed.set()
+        return "new", True
+
+    assert cache.get_or_fetch(key(), fetch, allow_stale=True) == ("old", "stale")
+    assert refreshed.wait(1)
+    for _ in range(100):
+        if cache.get(key()) == "new":
+            break
+        time.sleep(0.01)
+    assert cache.get(key()) == "new"
+    assert cache.refresher.refreshes == 1
+
+
+def test_without_allow_stale_an_expired_entry_is_fetched_again():
+    cache = ResponseCache(ttl=0.05, max_stale=10)
+    cache.set(key(), "old")
+    time.sleep(0.1)
+    assert cache.get_or_fetch(key(), lambda: ("new", True)) == ("new", "miss")
+
+
+def test_invalidate_drops_only_that_account_and_endpoint():
+    cache = ResponseCache()
+    cache.set(key("/agents"), "a")
+    cache.set(key("/knowledge"), "k")
+    cache.set(key("/agents", "other"), "b")
+    cache.invalidate(["/agents"], "key")
+    assert cache.get(key("/agents")) is None
+    assert cache.get(key("/knowledge")) == "k"
+    assert cache.get(key("/agents", "other")) == "b"
+
+
+def test_fetch_overlapping_an_invalidation_is_not_stored():
+    cache = ResponseCache()
+
+    def fetch():
+        cache.invalidate(["/agents"], "key")
+        return "from before the write", True
+
+    assert cache.get_or_fetch(key(), fetch) == ("from before the write", "miss")
+    assert cache.get(key()) is None
+    assert cache.get_or_fetch(key(), lambda: ("fresh", True)) == ("fresh", "miss")
+    assert cache.get(key()) == "fresh"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.set(key("/a"), 1)
+    cache.set(key("/b"), 2)
+    cache.get(key("/a"))
+    cache.set(key("/c"), 3)
+    assert cache.get(key("/b")) is None
+    assert cache.get(key("/a")) == 1
@@ -0,0 +1,27 @@
+import pytest
+
+from workato_api import reciprocal_rank_fusion
+
+
+def chunks(*contents):
+    return [{"content": c} for c in contents]
+
+
+def test_chunks_found_by_both_searches_rank_first():
+    fused = reciprocal_rank_fusion([chunks("a", "b", "c"), chunks("c", "d")], top_k=10, k=60)
+    assert [c["content"] for c in fused] == ["c", "a", "b", "d"]
+    assert fused[0]["rrf_score"] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[1]["rrf_score"] == pytest.approx(1 / 61)
+
+
+def test_same_content_counts_once_and_keeps_the_first_copy():
+    first = {"content": "a", "document_id": "one"}
+    fused = reciprocal_rank_fusion([[first], [{"content": "a", "document_id": "two"}]], top_k=10)
+    assert len(fused) == 1
+    assert fused[0]["document_id"] == "one"
+    assert "rrf_score" not in first
+
+
+def test_top_k_limits_the_result():
+    assert len(reciprocal_rank_fusion([chunks(*"abcdef")], top_k=3)) == 3
+    assert reciprocal_rank_fusion([], top_k=3) == []
@@ -0,0 +1,33 @@
+from workato_api import TOOL_RESULT_CACHE_TTL_SECONDS, tool_result_ttl
+
+
+def payload(verb="GET", name="lookup"):
+    return {"tool_call_name": name, "verb": verb, "endpoint": "/time"}
+
+
+def function(**metadata):
+    return {"name": "lookup", "internal_metadata": metadata}
+
+
+def test_get_functions_are_cacheable_by_default():
+    assert tool_result_ttl(payload(), [function()]) == TOOL_RESULT_CACHE_TTL_SECONDS
+    assert tool_result_ttl(payload("POST"), [function()]) is None
+
+
+def test_metadata_opts_in_and_out():
+    assert tool_result_ttl(payload("POST"), [function(cacheable=True, cache_ttl_seconds=30)]) == 30
+    assert tool_result_ttl(payload(), [function(cacheable=False)]) is None
+
+
+def test_malformed_metadata_never_breaks_or_enables_caching():
+    assert tool_result_ttl(payload(), [function(cache_ttl_seconds=None)]) == TOOL_RESULT_CACHE_TTL_SECONDS
+    assert tool_result_ttl(payload(), [function(cache_ttl_seconds="60")]) == TOOL_RESULT_CACHE_TTL_SECONDS
+    assert tool_result_ttl(payload(), [function(cacheable="false")]) is None
+    assert tool_result_ttl(payload("POST"), [function(cacheable="true")]) is None
+
+
+def test_function_is_found_by_endpoint_when_the_name_differs():
+    functions = [{"name": "other", "internal_metadata": {"apim_endpoint": "/time", "verb": None}},
+                 {"name": "other", "internal_metadata": {"apim_endpoint": "/time", "verb": "get",
+                                                         "cache_ttl_seconds": 5}}]
+    assert tool_result_ttl(payload(name="renamed"), functions) == 5
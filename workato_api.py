@@ -0,0 +1,1223 @@
+"""
+The Streamlit-free core of the playground: the HTTP client, the response
+cache, API requests, the agent send / tool-call loop, the function catalog
+and the chat message store. streamlit_app.py builds its UI on top of these,
+and batch_runner.py uses them to run prompts headlessly.
+"""
+import contextvars
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Point WORKATO_CHAT_API_URL at mock_server.py to run without the real APIM
+BASE_URL = os.environ.get("WORKATO_CHAT_API_URL", "https://apim.workato.com/workatop329/workato-chatapi-v1")
+# List endpoints the app serves stale-while-revalidate from its response cache
+STALE_WHILE_REVALIDATE_ENDPOINTS = {"/agents", "/functions", "/knowledge"}
+# Cached endpoints that each write makes out of date. A send that starts a chat
+# does not clear /agents/chats: the app adds the new chat to the cached list.
+CACHE_INVALIDATIONS = {
+    ("PUT", "/agents"): ["/agents"],
+    ("PUT", "/knowledge"): ["/knowledge"],
+    ("PUT", "/knowledge/document"): ["/knowledge"],
+    ("POST", "/functions/upsert"): ["/functions", "/functions/function-list", "/functions/swagger"],
+    ("POST", "/agents/chats/send"): ["/agents/chats/history"],
+}
+# ResponseCache defaults: seconds an entry stays fresh, and entries kept before
+# the least recently used are evicted
+CACHE_TTL_SECONDS = 60
+CACHE_MAX_ENTRIES = 1024
+# A stale entry is refreshed at most every REFRESH_MIN_INTERVAL_SECONDS, and the
+# BackgroundRefresher thread stops after REFRESH_IDLE_SECONDS with nothing to do
+REFRESH_MIN_INTERVAL_SECONDS = 10
+REFRESH_IDLE_SECONDS = 60
+# GET endpoints whose responses are kept on disk across restarts (see HttpCache)
+# and revalidated with If-None-Match / If-Modified-Since
+DISK_CACHE_ENDPOINTS = {"/agents", "/functions", "/functions/function-list", "/functions/swagger", "/knowledge"}
+HTTP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Process-wide limits on calls to BASE_URL (see RateLimiter): requests per second
+# and burst for all endpoints together, and tighter (rate, burst) budgets per endpoint
+RATE_LIMIT_PER_SECOND = 20
+RATE_LIMIT_BURST = 40
+ENDPOINT_RATE_LIMITS = {
+    "/tools/execute": (10, 10),
+    "/knowledge/document": (5, 5),
+}
+# Requests in flight start at CONCURRENCY_INITIAL, grow by one after a window of
+# good responses and halve on a 429, or on a response slower than
+# CONCURRENCY_LATENCY_FACTOR times the endpoint's usual latency (and CONCURRENCY_SLOW_SECONDS)
+CONCURRENCY_INITIAL = 16
+CONCURRENCY_MIN = 1
+CONCURRENCY_MAX = 64
+CONCURRENCY_LATENCY_FACTOR = 3
+CONCURRENCY_SLOW_SECONDS = 2.0
+# Longest a request waits for the rate limiter before it fails
+RATE_LIMIT_MAX_WAIT_SECONDS = 120
+# (connect, read) timeouts in seconds. Agent turns can take a while to answer.
+REQUEST_TIMEOUT = (5, 60)
+HTTP_POOL_SIZE = 20
+HTTP_MAX_RETRIES = 3
+# Maximum number of tool calls from one agent turn executed at the same time
+TOOL_CALL_CONCURRENCY = 4
+# How long a cacheable tool result is reused when its function sets no
+# cache_ttl_seconds (see tool_result_ttl)
+TOOL_RESULT_CACHE_TTL_SECONDS = 300
+# Chat message bytes a session keeps in memory over all its conversations; older messages spill to disk
+SESSION_MESSAGE_BUDGET_BYTES = 512 * 1024
+# Rank constant of reciprocal_rank_fusion
+RRF_K = 60
+# Send the results of all tool calls in a turn back in one incoming_steps list.
+# Set to False if the API only accepts one step per send.
+BATCH_TOOL_RESPONSES = True
+
+
+def api_key_fingerprint(api_key):
+    """A short, non-reversible identifier for an API key."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    """
+    LRU cache of API responses where every entry expires after `ttl` seconds
+    (or the ttl it was stored with). Keys are (method, endpoint, params, api key fingerprint) tuples. Safe to
+    share between sessions and worker threads. Counts hits, misses and
+    coalesced lookups (see get_or_fetch).
+    With max_stale, expired entries are kept that much longer so that
+    get_or_fetch(..., allow_stale=True) can answer with them while a
+    BackgroundRefresher fetches a new value.
+    A fetch that was already running when its key was invalidated does not
+    store its result: it may predate the write that caused the invalidation.
+    """
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, max_stale=0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+        # key -> (stored_at, value, version, ttl)
+        self._entries = OrderedDict()
+        # key -> Future of the fetch currently running for it
+        self._inflight = {}
+        # Bumped whenever a key gets a value different from the one it had
+        self._version = 0
+        # (endpoint, account) -> times invalidate() cleared it; _epoch counts invalidate_where() calls
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.refresher = BackgroundRefresher(self) if max_stale else None
+
+    @staticmethod
+    def make_key(method, endpoint, params, api_key):
+        # Only a hash of the key is kept, so the cache can be shared without holding credentials
+        return (method.upper(), endpoint, json.dumps(params or {}, sort_keys=True), api_key_fingerprint(api_key))
+
+    def _lookup(self, key, count_miss=True, allow_stale=False):
+        # Caller holds self._lock. Returns (value, is_stale), value None on a miss.
+        entry = self._entries.get(key)
+        age = time.monotonic() - entry[0] if entry is not None else 0
+        ttl = entry[3] if entry is not None else self.ttl
+        if entry is not None and age > ttl + self.max_stale:
+            del self._entries[key]
+            entry = None
+        if entry is None or (age > ttl and not allow_stale):
+            self.misses += 1 if count_miss else 0
+            return None, False
+        self._entries.move_to_end(key)
+        if age > ttl:
+            self.stale += 1
+            return entry[1], True
+        self.hits += 1
+        return entry[1], False
+
+    def get(self, key, count_miss=True):
+        """The fresh value for key, or None. count_miss=False for a peek that is followed by get_or_fetch."""
+        with self._lock:
+            return self._lookup(key, count_miss)[0]
+
+    def generation(self, key):
+        """
+        Token for the invalidations that cover key so far. Take it before
+        fetching and pass it to set(), which then drops the value if key was
+        invalidated in the meantime.
+        """
+        with self._lock:
+            return self._generation(key)
+
+    def _generation(self, key):
+        # Caller holds self._lock
+        return self._epoch, self._generations.get((key[1], key[3]), 0)
+
+    def set(self, key, value, ttl=None, generation=None):
+        """
+        Store value for key, fresh for ttl seconds (the cache's ttl by default).
+        Returns False, storing nothing, if generation is given and out of date.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation(key):
+                return False
+            previous = self._entries.get(key)
+            if previous is None or previous[1] != value:
+                self._version += 1
+                version = self._version
+            else:
+                version = previous[2]
+            self._entries[key] = (time.monotonic(), value, version, self.ttl if ttl is None else ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def version(self, key):
+        """A number that grows whenever key's value changes; 0 if key is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[2] if entry is not None else 0
+
+    def get_or_fetch(self, key, fetch, allow_stale=False, ttl=None):
+        """
+        Return (value, outcome) for key, where outcome is "hit", "miss",
+        "coalesced" or "stale". On a miss fetch() is called and must return
+        (value, store); the value is cached (for ttl seconds, if given) if
+        store is true. Threads that
+        miss on a key while its fetch is still running wait for that fetch
+        instead of starting their own, so N identical requests make one
+        upstream call. With allow_stale, an expired entry still inside
+        max_stale is returned at once and fetch() is handed to the
+        background refresher.
+        """
+        with self._lock:
+            value, is_stale = self._lookup(key, allow_stale=allow_stale and self.refresher is not None)
+            if is_stale:
+                self.refresher.request(key, fetch)
+                return value, "stale"
+            if value is not None:
+                return value, "hit"
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                generation = self._generation(key)
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result(), "coalesced"
+        try:
+            value, store = fetch()
+            if store:
+                self.set(key, value, ttl, generation)
+            future.set_result(value)
+            return value, "miss"
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def invalidate(self, endpoints, api_key):
+        """Drop every cached entry for the given endpoints and API key."""
+        account = api_key_fingerprint(api_key)
+        with self._lock:
+            for endpoint in endpoints:
+                self._generations[(endpoint, account)] = self._generations.get((endpoint, account), 0) + 1
+            self._drop(lambda key: key[1] in endpoints and key[3] == account)
+
+    def invalidate_where(self, predicate):
+        """Drop every cached entry whose key matches predicate. No fetch running now will store its result."""
+        with self._lock:
+            self._epoch += 1
+            self._drop(predicate)
+
+    def _drop(self, predicate):
+        # Caller holds self._lock
+        for key in [k for k in self._entries if predicate(k)]:
+            del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+
+class BackgroundRefresher:
+    """
+    Refetches stale ResponseCache entries on one daemon thread, so the
+    session that found them stale does not wait. Each key is refreshed at
+    most every min_interval seconds. The thread exits after idle_timeout
+    seconds without work and is started again by the next request().
+    """
+    def __init__(self, cache, min_interval=REFRESH_MIN_INTERVAL_SECONDS, idle_timeout=REFRESH_IDLE_SECONDS):
+        self.cache = cache
+        self.min_interval = min_interval
+        self.idle_timeout = idle_timeout
+        self.refreshes = 0
+        # key -> fetch, in request order; a key waiting already is not queued twice
+        self._pending = OrderedDict()
+        self._last_refresh = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def request(self, key, fetch):
+        """Queue a refresh of key with fetch() (which returns (value, store) like for get_or_fetch)."""
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_refresh.get(key, -math.inf) < self.min_interval:
+                return
+            if len(self._last_refresh) > self.cache.max_entries:
+                self._last_refresh = {k: t for k, t in self._last_refresh.items() if now - t < self.min_interval}
+            self._pending[key] = fetch
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cache-refresh", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._pending:
+                    self._condition.wait(self.idle_timeout)
+                if not self._pending:
+                    self._thread = None
+                    return
+                key, fetch = self._pending.popitem(last=False)
+                self._last_refresh[key] = time.monotonic()
+            generation = self.cache.generation(key)
+            try:
+                value, store = fetch()
+            except Exception:
+                continue
+            if store and self.cache.set(key, value, generation=generation):
+                self.refreshes += 1
+
+
+class HttpCache:
+    """
+    SQLite store of GET response bodies with their ETag / Last-Modified,
+    keyed by (API key fingerprint, URL) so that one key's responses are never
+    served to another. Entries are only ever used after the API confirms
+    them with a 304, so they never go stale; the least recently used are
+    evicted beyond max_bytes of bodies.
+    """
+    def __init__(self, path, max_bytes=HTTP_CACHE_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.revalidated = 0
+        self.stored = 0
+        self.evicted = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    account TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    used_at REAL NOT NULL,
+                    PRIMARY KEY (account, url)
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+            self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, account, url):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_type, body FROM responses WHERE account = ? AND url = ?",
+                (account, url)
+            ).fetchone()
+            if row:
+                self._conn.execute("UPDATE responses SET used_at = ? WHERE account = ? AND url = ?",
+                                   (time.time(), account, url))
+        return dict(zip(("etag", "last_modified", "content_type", "body"), row)) if row else None
+
+    def put(self, account, url, etag, last_modified, content_type, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            old = self._conn.execute("SELECT size FROM responses WHERE account = ? AND url = ?",
+                                     (account, url)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (account, url, etag, last_modified, content_type, body, len(body), time.time())
+            )
+            self._bytes += len(body) - (old[0] if old else 0)
+            self.stored += 1
+            while self._bytes > self.max_bytes:
+                oldest = self._conn.execute(
+                    "SELECT account, url, size FROM responses ORDER BY used_at LIMIT 16").fetchall()
+                for old_account, old_url, size in oldest:
+                    if self._bytes <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM responses WHERE account = ? AND url = ?", (old_account, old_url))
+                    self._bytes -= size
+                    self.evicted += 1
+
+    def record_revalidated(self):
+        with self._lock:
+            self.revalidated += 1
+
+    def clear(self, account=None):
+        """Drop every entry, or only those of one API key fingerprint."""
+        with self._lock, self._conn:
+            if account is None:
+                self._conn.execute("DELETE FROM responses")
+            else:
+                self._conn.execute("DELETE FROM responses WHERE account = ?", (account,))
+            self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"entries": entries, "bytes": self._bytes, "revalidated": self.revalidated,
+                    "stored": self.stored, "evicted": self.evicted}
+
+    def prometheus(self):
+        stats = self.stats()
+        return "\n".join([
+            "# HELP playground_http_cache_bytes Response bodies held in the on-disk HTTP cache.",
+            "# TYPE playground_http_cache_bytes gauge",
+            f"playground_http_cache_bytes {stats['bytes']}",
+            "# HELP playground_http_cache_entries Responses held in the on-disk HTTP cache.",
+            "# TYPE playground_http_cache_entries gauge",
+            f"playground_http_cache_entries {stats['entries']}",
+            "# HELP playground_http_cache_events_total Responses revalidated by a 304, stored, and evicted.",
+            "# TYPE playground_http_cache_events_total counter",
+            *(f'playground_http_cache_events_total{{event="{event}"}} {stats[event]}'
+              for event in ("revalidated", "stored", "evicted")),
+        ]) + "\n"
+
+
+def api_endpoint(url):
+    """The path of url relative to BASE_URL, without the query string; None for other hosts."""
+    return url.split("?", 1)[0][len(BASE_URL):] if url.startswith(BASE_URL) else None
+
+
+class TokenBucket:
+    """`rate` tokens a second, holding at most `burst`. Callers do the locking."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def wait_time(self, now):
+        """Seconds until a token is available, 0 if one is now."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """
+    Process-wide admission control for calls to the API: a token bucket for
+    all endpoints, one more per endpoint in endpoint_limits, and an adaptive
+    limit on requests in flight (additive increase after `limit` good
+    responses, halved on a 429 or an unusually slow response). Requests that
+    cannot go yet wait in acquire() instead of being sent into throttling,
+    and a 429 holds everything back for its Retry-After.
+    """
+    def __init__(self, rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST, endpoint_limits=None,
+                 concurrency=CONCURRENCY_INITIAL, min_concurrency=CONCURRENCY_MIN,
+                 max_concurrency=CONCURRENCY_MAX, max_wait=RATE_LIMIT_MAX_WAIT_SECONDS):
+        self.limit = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self._bucket = TokenBucket(rate, burst) if rate else None
+        limits = ENDPOINT_RATE_LIMITS if endpoint_limits is None else endpoint_limits
+        self._endpoint_buckets = {endpoint: TokenBucket(r, b) for endpoint, (r, b) in limits.items()}
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        self._paused_until = 0.0
+        self._successes = 0
+        self._last_decrease = 0.0
+        # endpoint -> moving average of its latency in seconds
+        self._latency = {}
+        # endpoint -> counters
+        self._endpoints = {}
+
+    def _endpoint_stats(self, endpoint):
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = {"requests": 0, "queued": 0, "wait_seconds": 0.0, "throttled": 0,
+                                         "slow": 0, "timed_out": 0}
+        return self._endpoints[endpoint]
+
+    def acquire(self, endpoint):
+        """Block until a request to endpoint may be sent. Raises TimeoutError after max_wait seconds."""
+        started = time.monotonic()
+        buckets = [b for b in (self._bucket, self._endpoint_buckets.get(endpoint)) if b is not None]
+        with self._cond:
+            stats = self._endpoint_stats(endpoint)
+            self._queued += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    # None: wait for a request in flight to finish
+                    wait = None
+                    if self._in_flight < self.limit:
+                        wait = max([self._paused_until - now] + [b.wait_time(now) for b in buckets])
+                        if wait <= 0:
+                            break
+                    remaining = started + self.max_wait - now
+                    if remaining <= 0:
+                        stats["timed_out"] += 1
+                        raise TimeoutError(f"Waited {self.max_wait}s for the API rate limit ({endpoint})")
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                self._queued -= 1
+            for bucket in buckets:
+                bucket.take()
+            self._in_flight += 1
+            waited = time.monotonic() - started
+            stats["requests"] += 1
+            if waited > 0.001:
+                stats["queued"] += 1
+                stats["wait_seconds"] += waited
+
+    def release(self, endpoint, status, seconds, retry_after=None):
+        """
+        Report how a request let through by acquire() went: its HTTP status
+        (None if no response came back), seconds until the response arrived,
+        and the Retry-After of a 429 in seconds.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            stats = self._endpoint_stats(endpoint)
+            if status == 429:
+                stats["throttled"] += 1
+                self._paused_until = max(self._paused_until, now + (retry_after or 1.0))
+                self._decrease(now)
+            elif status is not None and status < 500:
+                usual = self._latency.get(endpoint)
+                if usual is not None and seconds > max(CONCURRENCY_SLOW_SECONDS, CONCURRENCY_LATENCY_FACTOR * usual):
+                    stats["slow"] += 1
+                    self._decrease(now)
+                else:
+                    self._successes += 1
+                    if self._successes >= self.limit:
+                        self.limit = min(self.max_concurrency, self.limit + 1)
+                        self._successes = 0
+                self._latency[endpoint] = seconds if usual is None else usual + 0.1 * (seconds - usual)
+            self._cond.notify_all()
+
+    def _decrease(self, now):
+        # Caller holds the lock. At most once a second, so one burst of 429s halves the limit once.
+        if now - self._last_decrease >= 1.0:
+            self.limit = max(self.min_concurrency, self.limit // 2)
+            self._last_decrease = now
+        self._successes = 0
+
+    def stats(self):
+        with self._cond:
+            return {"limit": self.limit, "in_flight": self._in_flight, "queued": self._queued,
+                    "endpoints": {endpoint: dict(stats) for endpoint, stats in sorted(self._endpoints.items())}}
+
+    def prometheus(self):
+        stats = self.stats()
+        lines = [
+            "# HELP playground_rate_limit_concurrency Current limit on API requests in flight.",
+            "# TYPE playground_rate_limit_concurrency gauge",
+            f"playground_rate_limit_concurrency {stats['limit']}",
+            "# HELP playground_rate_limit_in_flight API requests in flight.",
+            "# TYPE playground_rate_limit_in_flight gauge",
+            f"playground_rate_limit_in_flight {stats['in_flight']}",
+            "# HELP playground_rate_limit_queue_depth API requests waiting for the rate limiter.",
+            "# TYPE playground_rate_limit_queue_depth gauge",
+            f"playground_rate_limit_queue_depth {stats['queued']}",
+        ]
+        for name, help_text, key in (
+            ("requests_total", "API requests let through by the rate limiter.", "requests"),
+            ("queued_total", "API requests that had to wait for the rate limiter.", "queued"),
+            ("wait_seconds_total", "Time API requests spent waiting for the rate limiter.", "wait_seconds"),
+            ("throttled_total", "API responses that were 429 Too Many Requests.", "throttled"),
+            ("slow_total", "API responses slow enough to lower the concurrency limit.", "slow"),
+            ("timed_out_total", "API requests that gave up waiting for the rate limiter.", "timed_out"),
+        ):
+            lines += [f"# HELP playground_rate_limit_{name} {help_text}",
+                      f"# TYPE playground_rate_limit_{name} counter"]
+            lines += [f'playground_rate_limit_{name}{{endpoint="{endpoint}"}} {counters[key]:g}'
+                      for endpoint, counters in stats["endpoints"].items()]
+        return "\n".join(lines) + "\n"
+
+
+class RateLimitedHTTPAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter that lets requests to BASE_URL through a RateLimiter (all
+    requests go straight through without one). A 429 is sent again, up to
+    HTTP_MAX_RETRIES times and whatever the method, once the limiter admits
+    it: APIM has not acted on a throttled request.
+    """
+    def __init__(self, limiter=None, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+
+    def send(self, request, stream=False, **kwargs):
+        endpoint = api_endpoint(request.url)
+        if self.limiter is None or endpoint is None:
+            return super().send(request, stream=stream, **kwargs)
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            self.limiter.acquire(endpoint)
+            started = time.monotonic()
+            status = retry_after = None
+            try:
+                response = super().send(request, stream=stream, **kwargs)
+                status = response.status_code
+                if status == 429:
+                    try:
+                        retry_after = float(response.headers.get("Retry-After", ""))
+                    except ValueError:
+                        pass
+            finally:
+                self.limiter.release(endpoint, status, time.monotonic() - started, retry_after)
+            if status != 429 or attempt == HTTP_MAX_RETRIES:
+                return response
+            response.close()
+
+
+class CachingHTTPAdapter(RateLimitedHTTPAdapter):
+    """
+    An HTTPAdapter that answers GETs to DISK_CACHE_ENDPOINTS through an
+    HttpCache: a stored response is revalidated with a conditional request,
+    and a 304 is turned back into a 200 carrying the stored body (with
+    `revalidated` set on the response). Requests that already carry
+    conditional headers, and streamed ones, are passed through untouched.
+    """
+    def __init__(self, cache, limiter=None, **kwargs):
+        super().__init__(limiter=limiter, **kwargs)
+        self.cache = cache
+
+    def send(self, request, stream=False, **kwargs):
+        url = request.url
+        endpoint = api_endpoint(url)
+        if (request.method != "GET" or stream or endpoint not in DISK_CACHE_ENDPOINTS
+                or "If-None-Match" in request.headers or "If-Modified-Since" in request.headers):
+            return super().send(request, stream=stream, **kwargs)
+        account = api_key_fingerprint(request.headers.get("API-Token", ""))
+        cached = self.cache.get(account, url)
+        if cached and cached["etag"]:
+            request.headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            request.headers["If-Modified-Since"] = cached["last_modified"]
+        response = super().send(request, stream=stream, **kwargs)
+        if response.status_code == 304 and cached:
+            # Read the empty body first so the connection goes back to the pool
+            response.content
+            response.status_code = 200
+            response.reason = "OK"
+            response._content = cached["body"]
+            response.headers["Content-Type"] = cached["content_type"] or "application/json"
+            response.headers["Content-Length"] = str(len(cached["body"]))
+            response.revalidated = True
+            self.cache.record_revalidated()
+        elif (response.status_code == 200 and "no-store" not in response.headers.get("Cache-Control", "")
+              and (response.headers.get("ETag") or response.headers.get("Last-Modified"))):
+            self.cache.put(account, url, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                           response.headers.get("Content-Type"), response.content)
+        return response
+
+
+def make_http_client(client=None, pool_size=HTTP_POOL_SIZE, http_cache=None, limiter=None):
+    """
+    Set up client (a new requests.Session by default) with a keep-alive pool
+    of pool_size connections. Idempotent verbs are retried with jittered
+    exponential backoff, and Retry-After is honoured on 429/503 responses.
+    With an HttpCache, GETs to DISK_CACHE_ENDPOINTS are revalidated against it;
+    with a RateLimiter, requests to BASE_URL wait for it and it handles 429s.
+    """
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=0.5,
+        backoff_jitter=0.5,
+        status_forcelist=(502, 503, 504) if limiter is not None else (429, 502, 503, 504),
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    if http_cache is not None:
+        adapter = CachingHTTPAdapter(http_cache, limiter=limiter, pool_connections=pool_size,
+                                     pool_maxsize=pool_size, max_retries=retry)
+    else:
+        adapter = RateLimitedHTTPAdapter(limiter=limiter, pool_connections=pool_size, pool_maxsize=pool_size,
+                                         max_retries=retry)
+    client = client if client is not None else Session()
+    client.mount("https://", adapter)
+    client.mount("http://", adapter)
+    return client
+
+
+def send_request(client, api_key, cache, method, endpoint, data=None, params=None):
+    """
+    Send one request to the API, without looking in the cache. Returns
+    (result, ok) where ok is false for failed requests, error statuses and
+    results carrying an "error", none of which may be cached. Writes clear
+    the cached endpoints listed in CACHE_INVALIDATIONS.
+    """
+    method = method.upper()
+    headers = {"API-Token": api_key}
+    try:
+        response = client.request(
+            method=method,
+            url=f"{BASE_URL}{endpoint}",
+            headers=headers,
+            json=data,
+            params=params,
+            timeout=REQUEST_TIMEOUT
+        )
+        result = response.json() if response.content else {}
+    except Exception as e:
+        return {"error": str(e)}, False
+    finally:
+        # Clear even if the write failed; it may have been partially applied
+        if cache is not None and (method, endpoint) in CACHE_INVALIDATIONS:
+            cache.invalidate(CACHE_INVALIDATIONS[(method, endpoint)], api_key)
+    return result, response.ok and not (isinstance(result, dict) and "error" in result)
+
+
+def api_request(client, api_key, cache, method, endpoint, data=None, params=None):
+    """
+    The body of the app's make_request. It takes the client, API key and
+    cache explicitly and never touches Streamlit, so worker threads and
+    batch_runner.py can call it.
+    Pass cache=None to always go to the API. Concurrent identical GETs,
+    from this session or any other, share one upstream call, and
+    STALE_WHILE_REVALIDATE_ENDPOINTS may answer from a stale entry.
+    """
+    method = method.upper()
+
+    def send():
+        return send_request(client, api_key, cache, method, endpoint, data=data, params=params)
+
+    if method == "GET" and cache is not None:
+        result, outcome = cache.get_or_fetch(cache.make_key(method, endpoint, params, api_key), send,
+                                             allow_stale=endpoint in STALE_WHILE_REVALIDATE_ENDPOINTS)
+        if hasattr(client, "metrics"):
+            client.metrics.record_cache(method, endpoint, outcome)
+        return result
+    return send()[0]
+
+
+def canonical_args(args):
+    """A tool call's args (a JSON string) with sorted keys and no spacing, so equal arguments compare equal."""
+    try:
+        return json.dumps(json.loads(args), sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return str(args).strip()
+
+
+def tool_result_ttl(payload, functions):
+    """
+    Seconds the result of a tool call (a /tools/execute payload) may be
+    reused, or None if it must run every time. functions are the
+    chat_function entries of its registry: a function opts in with
+    "cacheable": true in its internal_metadata, or out with false, and may
+    set "cache_ttl_seconds". Other GET functions are cacheable by default.
+    A "cacheable" other than true or false counts as false, and a TTL that
+    is not a number as unset.
+    """
+    def metadata_of(function):
+        return function.get("internal_metadata") or {}
+
+    # The function the call names, else the one behind the same verb and endpoint
+    by_name = [metadata_of(f) for f in functions if f.get("name") == payload["tool_call_name"]]
+    by_endpoint = [metadata_of(f) for f in functions
+                   if metadata_of(f).get("apim_endpoint") == payload["endpoint"]
+                   and str(metadata_of(f).get("verb") or "").upper() == payload["verb"].upper()]
+    metadata = (by_name or by_endpoint or [{}])[0]
+    # Only a JSON true counts; "false" (a string) must not cache the function
+    if metadata.get("cacheable", payload["verb"].upper() == "GET") is not True:
+        return None
+    ttl = metadata.get("cache_ttl_seconds")
+    if isinstance(ttl, bool) or not isinstance(ttl, (int, float)):
+        ttl = TOOL_RESULT_CACHE_TTL_SECONDS
+    return float(ttl)
+
+
+def execute_tool_calls(client, api_key, cache, tool_calls, tool_cache=None):
+    """
+    Run the tool calls of one agent turn through POST /tools/execute,
+    at most TOOL_CALL_CONCURRENCY at a time. Results keep the order of the calls.
+    With a tool_cache (a ResponseCache), results of cacheable functions (see
+    tool_result_ttl) are reused for identical calls with the same API key.
+    """
+    payloads = [
+        {
+            "verb": call.get("APIM_VERB", ""),
+            "endpoint": call.get("APIM_ENDPOINT", ""),
+            "tool_call_id": call.get("tool_call_id", ""),
+            "tool_call_name": call.get("tool_call_name", ""),
+            "args": call.get("args", ""),
+            "function_registry_id": call.get("Function_registry_id", "")
+        }
+        for call in tool_calls
+    ]
+    functions = {}
+    if tool_cache is not None:
+        for registry_id in {p["function_registry_id"] for p in payloads}:
+            response = api_request(client, api_key, cache, "GET", "/functions/function-list",
+                                   params={"function_registry_id": registry_id})
+            functions[registry_id] = [item.get("chat_function", {}) for item in response.get("chat_functions", [])]
+
+    def execute(payload):
+        ttl = tool_result_ttl(payload, functions[payload["function_registry_id"]]) if tool_cache is not None else None
+        if ttl is None:
+            return api_request(client, api_key, cache, "POST", "/tools/execute", data=payload)
+        key = tool_cache.make_key("POST", "/tools/execute", {
+            "function_registry_id": payload["function_registry_id"],
+            "verb": payload["verb"].upper(),
+            "endpoint": payload["endpoint"],
+            "args": canonical_args(payload["args"]),
+        }, api_key)
+        result, outcome = tool_cache.get_or_fetch(
+            key, lambda: send_request(client, api_key, cache, "POST", "/tools/execute", data=payload), ttl=ttl)
+        if hasattr(client, "metrics"):
+            client.metrics.record_cache("POST", "/tools/execute", outcome)
+        # A reused result still answers this call
+        if isinstance(result, dict) and "tool_call_id" in result:
+            result = dict(result, tool_call_id=payload["tool_call_id"])
+        return result
+
+    if len(payloads) == 1:
+        return [execute(payloads[0])]
+    with ThreadPoolExecutor(max_workers=min(TOOL_CALL_CONCURRENCY, len(payloads))) as pool:
+        return list(pool.map(in_current_context(execute), payloads))
+
+
+def process_agent_responses(client, api_key, cache, agent_id, chat_id, agent_responses, on_progress=None,
+                            on_tool_call=None, tool_cache=None):
+    """
+    Work through an agent's responses until it stops calling tools.
+    Tool calls from the same turn run concurrently and their results go back
+    in a single send (see BATCH_TOOL_RESPONSES). Returns the chat messages to show.
+    on_progress, if given, is called with a line of text as each step happens;
+    on_tool_call, with (tool call, result) as each tool call completes.
+    tool_cache is passed on to execute_tool_calls.
+    """
+    def progress(text):
+        if on_progress:
+            on_progress(text)
+
+    messages = []
+    # Loop until there are no more agent_responses left to process
+    while agent_responses:
+        new_agent_responses = []
+        tool_calls = []
+
+        for resp in agent_responses:
+            # 1) If this response has plain text content, show it
+            if resp.get("content", ""):
+                messages.append({
+                    "role": "assistant",
+                    "content": resp.get("content", ""),
+                    "timestamp": datetime.now().isoformat()
+                })
+            # 2) Collect tool calls to execute together
+            if resp.get("tool_call_id", ""):
+                tool_calls.append(resp)
+
+        if tool_calls:
+            progress("Running " + ", ".join(f"`{c.get('tool_call_name', '')}`" for c in tool_calls))
+            tool_results = execute_tool_calls(client, api_key, cache, tool_calls, tool_cache)
+            result_steps = []
+            for call, tool_response in zip(tool_calls, tool_results):
+                if on_tool_call:
+                    on_tool_call(call, tool_response)
+                result_steps.append({
+                    "payload": {
+                        "step_type": "tool_execution_response",
+                        "tool_call_id": f"{call['tool_call_id']}",
+                        "content": f"{tool_response}"
+                    }
+                })
+                # Locally display that the function was called
+                messages.append({
+                    "role": "assistant",
+                    "content": f"`Executed function - {call.get('tool_call_name', '')}`",
+                    "timestamp": datetime.now().isoformat()
+                })
+
+            # Send the tool results back to the conversation
+            batches = [result_steps] if BATCH_TOOL_RESPONSES else [[step] for step in result_steps]
+            progress(f"Sending {len(result_steps)} tool result(s) back to the agent")
+            for incoming_steps in batches:
+                followup_response = api_request(client, api_key, cache, "POST", "/agents/chats/send", data={
+                    "agent_id": agent_id,
+                    "chat_id": chat_id,
+                    "user_email": "user@example.com",
+                    "incoming_steps": incoming_steps
+                })
+                # 3) The follow-up may include further agent_responses (tool calls, text, etc.)
+                #    Collect them to process on the next iteration
+                if "agent_response" in followup_response:
+                    new_agent_responses.extend(followup_response["agent_response"])
+                    for resp in followup_response["agent_response"]:
+                        if resp.get("content", ""):
+                            progress(resp["content"])
+
+        agent_responses = new_agent_responses
+    return messages
+
+
+def in_current_context(fn):
+    """
+    Wrap fn so that it runs with the caller's context variables (such as the
+    app's section and rerun tags) when it is called on a worker thread.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def quantile(samples, q):
+    """Nearest-rank quantile of a list of numbers, 0 for an empty list."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class FunctionCatalog:
+    """
+    Searchable index of the functions in every function registry: name,
+    description, verb, APIM endpoint and registry id. refresh() only
+    re-fetches registries whose updated_at has changed.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # registry_id -> {"updated_at": ..., "functions": [entry, ...]}
+        self._registries = {}
+        self._entries = []
+        # trigram -> set of positions in self._entries whose text contains it
+        self._index = {}
+
+    def refresh(self, registries, fetch, executor):
+        """
+        Bring the catalog in line with a /functions listing. fetch(registry_id)
+        returns that registry's /functions/function-list response and runs
+        on executor, so changed registries load concurrently.
+        Returns the number of registries fetched.
+        """
+        current = {r.get("function_registry_id", ""): r.get("updated_at") for r in registries}
+        with self._lock:
+            changed = [rid for rid, updated_at in current.items()
+                       if rid not in self._registries or self._registries[rid]["updated_at"] != updated_at]
+            removed = set(self._registries) - set(current)
+        if not changed and not removed:
+            return 0
+
+        fetched = dict(zip(changed, executor.map(in_current_context(fetch), changed)))
+        with self._lock:
+            for rid in removed:
+                self._registries.pop(rid, None)
+            for rid, response in fetched.items():
+                # Failed fetches keep their old entry and are retried next time
+                if "chat_functions" not in response:
+                    continue
+                functions = []
+                for fn_obj in response["chat_functions"]:
+                    fn_data = fn_obj.get("chat_function", {})
+                    imd = fn_data.get("internal_metadata", {}) or {}
+                    functions.append({
+                        "name": fn_data.get("name", ""),
+                        "description": fn_data.get("description", ""),
+                        "verb": imd.get("verb", ""),
+                        "apim_endpoint": imd.get("apim_endpoint", ""),
+                        "function_registry_id": rid,
+                    })
+                self._registries[rid] = {"updated_at": current[rid], "functions": functions}
+            self._rebuild_index()
+        return len(changed)
+
+    def _rebuild_index(self):
+        self._entries = [fn for reg in self._registries.values() for fn in reg["functions"]]
+        self._index = {}
+        for position, entry in enumerate(self._entries):
+            entry["_text"] = " ".join(str(v) for k, v in entry.items() if k != "_text").lower()
+            for trigram in trigrams(entry["_text"]):
+                self._index.setdefault(trigram, set()).add(position)
+
+    def search(self, query, limit=200):
+        """
+        Functions whose text contains every word of the query. The trigram
+        index narrows the candidates; each candidate is then checked for the
+        word itself, so a word matches the same way whatever else is indexed.
+        """
+        with self._lock:
+            entries, index = self._entries, self._index
+        matches = None
+        for term in query.lower().split():
+            pool = range(len(entries)) if matches is None else matches
+            grams = trigrams(term)
+            # Words shorter than three characters are checked against every candidate
+            if grams:
+                candidates = set.intersection(*(index.get(g, set()) for g in grams))
+                pool = candidates if matches is None else matches & candidates
+            matches = {p for p in pool if term in entries[p]["_text"]}
+            if not matches:
+                return []
+        positions = sorted(matches) if matches is not None else range(len(entries))
+        return [{k: v for k, v in entries[p].items() if k != "_text"} for p in positions[:limit]]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def trigrams(text):
+    """The set of three-character substrings of text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def reciprocal_rank_fusion(result_lists, top_k, k=RRF_K):
+    """
+    Merge ranked lists of retrieved chunks with reciprocal-rank fusion:
+    each chunk scores the sum of 1 / (k + rank) over the lists it appears in.
+    Chunks with the same content count as one. Returns the top_k chunks,
+    best first, each with an added "rrf_score".
+    """
+    fused = {}
+    for chunks in result_lists:
+        for rank, chunk in enumerate(chunks, start=1):
+            content_hash = hashlib.sha256(chunk.get("content", "").encode()).hexdigest()
+            if content_hash not in fused:
+                fused[content_hash] = dict(chunk, rrf_score=0.0)
+            fused[content_hash]["rrf_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda c: c["rrf_score"], reverse=True)[:top_k]
+
+
+class Message:
+    """One chat message, slotted, with the timestamp kept as epoch seconds."""
+    __slots__ = ("role", "content", "timestamp", "nbytes")
+
+    def __init__(self, role, content, timestamp=None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.timestamp = timestamp
+        self.nbytes = sys.getsizeof(self) + sys.getsizeof(content) + (24 if timestamp is not None else 0)
+
+    @classmethod
+    def from_dict(cls, message):
+        """Build from the {"role", "content", "timestamp"} dicts the chat code produces."""
+        timestamp = message.get("timestamp")
+        if isinstance(timestamp, str):
+            try:
+                timestamp = datetime.fromisoformat(timestamp).timestamp()
+            except ValueError:
+                timestamp = None
+        return cls(message["role"], message.get("content") or "", timestamp)
+
+    def __getitem__(self, key):
+        # Read like the message dicts, so rendering code works with either
+        if key == "timestamp":
+            return datetime.fromtimestamp(self.timestamp).isoformat(sep=" ", timespec="seconds") \
+                if self.timestamp is not None else ""
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self.__slots__ else default
+
+
+class MessageSpill:
+    """
+    Process-wide overflow for MessageStores, in a temporary SQLite database
+    that SQLite deletes when the process exits (sessions do not survive a
+    restart). Rows are deleted with the store they belong to.
+    """
+    def __init__(self):
+        # "" opens a private temporary database that lives on disk once it outgrows the page cache
+        self._conn = sqlite3.connect("", check_same_thread=False)
+        self._lock = threading.Lock()
+        self.stores = weakref.WeakSet()
+        # owner -> WeakSet of that owner's stores
+        self._owners = {}
+        # Ids of garbage-collected stores. Finalizers only queue them (they can run
+        # while this thread holds the lock); the rows go on the next call.
+        self._discarded = []
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE messages (
+                    store TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp REAL,
+                    PRIMARY KEY (store, seq)
+                )
+                """
+            )
+
+    def register(self, store):
+        with self._lock:
+            for owner in [o for o, stores in self._owners.items() if not stores]:
+                del self._owners[owner]
+            self.stores.add(store)
+            self._owners.setdefault(store.owner, weakref.WeakSet()).add(store)
+
+    def owner_stores(self, owner):
+        """The live stores of owner."""
+        with self._lock:
+            return list(self._owners.get(owner, ()))
+
+    def discard(self, store_id):
+        self._discarded.append(store_id)
+
+    def _delete_discarded(self):
+        # Caller holds self._lock
+        while self._discarded:
+            self._conn.execute("DELETE FROM messages WHERE store = ?", (self._discarded.pop(),))
+
+    def put(self, store_id, first_seq, messages):
+        with self._lock, self._conn:
+            self._delete_discarded()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)",
+                [(store_id, first_seq + i, m.role, m.content, m.timestamp) for i, m in enumerate(messages)]
+            )
+
+    def get(self, store_id, start, stop):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, timestamp FROM messages WHERE store = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (store_id, start, stop)
+            ).fetchall()
+        return [Message(*row) for row in rows]
+
+    def delete(self, store_id, from_seq=0):
+        """Delete a store's rows from from_seq on and return the content bytes they held."""
+        with self._lock, self._conn:
+            self._delete_discarded()
+            (freed,) = self._conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0) FROM messages WHERE store = ? AND seq >= ?",
+                (store_id, from_seq)
+            ).fetchone()
+            self._conn.execute("DELETE FROM messages WHERE store = ? AND seq >= ?", (store_id, from_seq))
+        return freed
+
+    def session_bytes(self):
+        """{owner: (bytes in memory, bytes spilled)} over the live stores."""
+        totals = {}
+        for store in list(self.stores):
+            memory, spilled = totals.get(store.owner, (0, 0))
+            totals[store.owner] = (memory + store.bytes, spilled + store.spilled_bytes)
+        return totals
+
+    def prometheus(self):
+        sessions = self.session_bytes()
+        return "\n".join([
+            "# HELP playground_message_bytes Chat message bytes over all sessions, by where they are kept.",
+            "# TYPE playground_message_bytes gauge",
+            f'playground_message_bytes{{location="memory"}} {sum(m for m, _ in sessions.values())}',
+            f'playground_message_bytes{{location="disk"}} {sum(d for _, d in sessions.values())}',
+            "# HELP playground_session_message_bytes_max Largest in-memory chat message bytes of any session.",
+            "# TYPE playground_session_message_bytes_max gauge",
+            f"playground_session_message_bytes_max {max((m for m, _ in sessions.values()), default=0)}",
+            "# HELP playground_sessions_with_messages Sessions holding chat messages.",
+            "# TYPE playground_sessions_with_messages gauge",
+            f"playground_sessions_with_messages {len(sessions)}",
+        ]) + "\n"
+
+
+class MessageStore:
+    """
+    The messages of one conversation. The newest stay in memory as Message
+    objects; older ones are written to a MessageSpill and read back when a
+    slice reaches them. All stores of one owner (a session) share `budget`
+    bytes of memory: when they go over it, the owner's other stores are
+    spilled first, then this one's oldest messages. Supports len(), append(),
+    extend(), slicing (e.g. store[-30:]) and truncate(). Accepts message
+    dicts or Messages.
+    """
+    def __init__(self, spill, budget=SESSION_MESSAGE_BUDGET_BYTES, owner=""):
+        self.id = uuid.uuid4().hex
+        self.spill = spill
+        self.budget = budget
+        self.owner = owner
+        self.bytes = 0
+        self.spilled_bytes = 0
+        self._memory = deque()
+        # Messages 0 .. _spilled - 1 are on disk
+        self._spilled = 0
+        spill.register(self)
+        weakref.finalize(self, spill.discard, self.id)
+
+    def __len__(self):
+        return self._spilled + len(self._memory)
+
+    def append(self, message):
+        if not isinstance(message, Message):
+            message = Message.from_dict(message)
+        self._memory.append(message)
+        self.bytes += message.nbytes
+        if self.bytes > self.budget:
+            self.spill_oldest(self.budget)
+        if self.owner:
+            others = [s for s in self.spill.owner_stores(self.owner) if s is not self]
+            if self.bytes + sum(s.bytes for s in others) > self.budget:
+                for other in others:
+                    other.spill_oldest()
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def spill_oldest(self, keep_bytes=0):
+        """Move the oldest in-memory messages to disk until at most keep_bytes remain."""
+        moving = []
+        while self._memory and self.bytes > keep_bytes:
+            message = self._memory.popleft()
+            self.bytes -= message.nbytes
+            self.spilled_bytes += len(message.content.encode())
+            moving.append(message)
+        if moving:
+            self.spill.put(self.id, self._spilled, moving)
+            self._spilled += len(moving)
+
+    def truncate(self, length):
+        """Drop every message from position length on."""
+        while len(self) > length and len(self._memory):
+            self.bytes -= self._memory.pop().nbytes
+        if self._spilled > length:
+            self.spilled_bytes -= self.spill.delete(self.id, length)
+            self._spilled = length
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("message index out of range")
+            return self[index:index + 1][0]
+        start, stop, step = index.indices(len(self))
+        if step != 1 or start >= stop:
+            return [self[i] for i in range(start, stop, step)] if step != 1 else []
+        messages = self.spill.get(self.id, start, min(stop, self._spilled)) if start < self._spilled else []
+        first = max(start - self._spilled, 0)
+        messages.extend(self._memory[i] for i in range(first, stop - self._spilled))
+        return messages
+
+    def __iter__(self):
+        return iter(self[:])